@@ -1,5 +1,8 @@
-from flask import Flask, request, render_template, jsonify
+from flask import Flask, request, render_template, jsonify, session, Response, stream_with_context
 import os
+import json
+import time
+import uuid
 from langchain_groq import ChatGroq
 from langchain_community.embeddings import OllamaEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -9,7 +12,12 @@ from langchain.chains import create_retrieval_chain, create_history_aware_retrie
 from langchain_community.vectorstores import FAISS
 from langchain_core.messages import AIMessage, HumanMessage
 from dotenv import load_dotenv
-import pickle  # For saving/loading embeddings
+from vector_store import store_exists, load_store, migrate_pickle, stored_vectors
+from conversation_memory import ConversationMemory, PromptTokenCounter, TurnLog, messages_tokens
+from query_router import RewriteStats
+from langchain_core.runnables import RunnableBranch, RunnableLambda
+from context_compressor import ContextCompressor
+from embedding_cache import cached_embeddings
 
 # Load environment variables
 load_dotenv()
@@ -62,32 +70,76 @@ contextualize_q_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-# Load precomputed FAISS vectors
+# Load precomputed FAISS vectors (memory-mapped native index + SQLite docstore)
+store_dir = "vector_store"
+
 def load_precomputed_vectors():
-    with open("vectors.pkl", "rb") as file:
-        return pickle.load(file)
+    if not store_exists(store_dir):
+        if not os.path.exists("vectors.pkl"):
+            return None
+        # One-time migration from the old pickle format; locked, so concurrent workers convert once
+        migrate_pickle("vectors.pkl", store_dir)
+    # Query and chunk embeddings go through the same on-disk cache as ingestion
+    return load_store(store_dir, cached_embeddings(OllamaEmbeddings()))
 
 vectors = load_precomputed_vectors()  # Load embeddings on startup
-retriever = vectors.as_retriever()
 
-# Create history-aware retriever
-history_aware_retriever = create_history_aware_retriever(llm, retriever, contextualize_q_prompt)
+# Question rewrites and context compression are counted for /stats
+rewrite_stats = RewriteStats()
+
+# Drop near-duplicates (using the vectors already in the index), merge overlapping
+# chunks and cap the stuffed context size
+context_compressor = ContextCompressor(
+    lambda docs: stored_vectors(vectors, docs),
+    max_context_tokens=int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500")),
+    dedupe_threshold=float(os.getenv("CONTEXT_DEDUPE_THRESHOLD", "0.95")),
+)
+
+def build_rag_chain(vectors):
+    retriever = vectors.as_retriever(search_kwargs={"k": int(os.getenv("RETRIEVER_K", "4"))})
+
+    # Create history-aware retriever; the LLM rewrite only runs for ambiguous follow-ups.
+    # First turns and self-contained questions go straight to the FAISS retriever.
+    history_aware_retriever = RunnableBranch(
+        (
+            lambda x: not rewrite_stats.record(x["input"], x.get("chat_history")),
+            (lambda x: x["input"]) | retriever,
+        ),
+        create_history_aware_retriever(llm, retriever, contextualize_q_prompt),
+    ).with_config(run_name="chat_retriever_chain")
 
-# Create document processing chain
-question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
+    # Create document processing chain
+    question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
 
-# RAG Chain
-rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
+    return create_retrieval_chain(history_aware_retriever | RunnableLambda(context_compressor.compress), question_answer_chain)
+
+# RAG Chain; without an embedding database the routes answer with an error instead
+rag_chain = build_rag_chain(vectors) if vectors is not None else None
 
 # Initialize Flask app
 app = Flask(__name__)
-chat_history = []  # Stores conversation history
+app.secret_key = os.getenv("FLASK_SECRET_KEY") or os.urandom(24)
+
+# Per-session conversation history, capped at a token budget; older turns are
+# folded into a rolling LLM summary so prompt size stays flat as chats grow
+memory = ConversationMemory(
+    llm,
+    max_history_tokens=int(os.getenv("HISTORY_TOKEN_BUDGET", "1000")),
+    max_sessions=int(os.getenv("MAX_SESSIONS", "1000")),
+    session_ttl=int(os.getenv("SESSION_TTL_SECONDS", "3600")),
+)
+turn_log = TurnLog()
+
+def get_session_id():
+    if "sid" not in session:
+        session["sid"] = uuid.uuid4().hex
+    return session["sid"]
 
 @app.route("/", methods=["GET", "POST"])
 def index():
-    global chat_history
     answer = None
     context = None
+    session_id = get_session_id()
 
     if request.method == "POST":
         user_prompt = request.form.get("user_prompt")
@@ -95,16 +147,105 @@ def index():
         if vectors is None:
             answer = "The embedding database is not available."
         else:
-            response = rag_chain.invoke({"input": user_prompt, "chat_history": chat_history})
+            start = time.perf_counter()
+            chat_history = memory.history(session_id)
+            token_counter = PromptTokenCounter()
+            response = rag_chain.invoke(
+                {"input": user_prompt, "chat_history": chat_history},
+                config={"callbacks": [token_counter]},
+            )
             answer = response["answer"]
 
-            # Update chat history
-            chat_history.extend([
-                HumanMessage(content=user_prompt),
-                AIMessage(content=answer)
-            ])
-
-    return render_template("chatapp.html", answer=answer, history=chat_history)
+            record = {
+                "session": session_id[:8],
+                "history_messages": len(chat_history),
+                "history_tokens_est": messages_tokens(chat_history),
+                "llm_calls": len(token_counter.calls),
+                "prompt_tokens": token_counter.prompt_tokens,
+                "total_s": round(time.perf_counter() - start, 3),
+            }
+            turn_log.add(record)
+            print(f"Prompt tokens this turn: {record}")
+
+            # Update this session's chat history; a summary, if needed, runs in the background
+            memory.append(session_id, user_prompt, answer,
+                          on_summary=lambda counter: turn_log.add_summary_usage(record, counter))
+
+    return render_template("chatapp.html", answer=answer, history=memory.turns(session_id))
+
+def citations(docs):
+    seen, sources = set(), []
+    for doc in docs:
+        source = os.path.basename(str(doc.metadata.get("source", "unknown")))
+        page = doc.metadata.get("page")
+        if (source, page) not in seen:
+            seen.add((source, page))
+            sources.append({"source": source, "page": page + 1 if isinstance(page, int) else page})
+    return sources
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Streaming variant: sends source citations as soon as retrieval finishes,
+# then answer tokens as Groq produces them (Server-Sent Events)
+@app.route("/stream", methods=["POST"])
+def stream():
+    user_prompt = request.form.get("user_prompt") or (request.get_json(silent=True) or {}).get("user_prompt")
+    if not user_prompt:
+        return jsonify({"error": "user_prompt is required"}), 400
+    if vectors is None:
+        return jsonify({"error": "The embedding database is not available."}), 503
+    session_id = get_session_id()
+
+    def generate():
+        start = time.perf_counter()
+        first_token_s = None
+        chat_history = memory.history(session_id)
+        token_counter = PromptTokenCounter()
+        answer_parts = []
+        try:
+            for chunk in rag_chain.stream(
+                {"input": user_prompt, "chat_history": chat_history},
+                config={"callbacks": [token_counter]},
+            ):
+                if "context" in chunk:
+                    yield sse("sources", citations(chunk["context"]))
+                if chunk.get("answer"):
+                    if first_token_s is None:
+                        first_token_s = time.perf_counter() - start
+                    answer_parts.append(chunk["answer"])
+                    yield sse("token", chunk["answer"])
+        except Exception as e:
+            yield sse("error", str(e))
+            return
+
+        answer = "".join(answer_parts)
+        record = {
+            "session": session_id[:8],
+            "history_messages": len(chat_history),
+            "history_tokens_est": messages_tokens(chat_history),
+            "llm_calls": len(token_counter.calls),
+            "prompt_tokens": token_counter.prompt_tokens,
+            "ttft_s": round(first_token_s, 3) if first_token_s is not None else None,
+            "total_s": round(time.perf_counter() - start, 3),
+        }
+        turn_log.add(record)
+        print(f"Streamed turn: {record}")
+        memory.append(session_id, user_prompt, answer,
+                      on_summary=lambda counter: turn_log.add_summary_usage(record, counter))
+        yield sse("done", {"ttft_s": record["ttft_s"], "total_s": record["total_s"]})
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify({
+        **turn_log.snapshot(),
+        "question_rewrites": rewrite_stats.snapshot(),
+        "context_compression": context_compressor.snapshot(),
+        "embedding_cache": vectors.embedding_function.stats() if vectors is not None else None,
+    })
 
 if __name__ == "__main__":
     app.run(debug=True, port=5001, use_reloader=False)
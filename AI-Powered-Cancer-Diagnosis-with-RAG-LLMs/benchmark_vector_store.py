@@ -0,0 +1,75 @@
+"""Startup-time and memory benchmark: pickled vectors.pkl vs native vector_store/.
+
+Starts N worker processes at the same time for each format. Every worker
+loads the store, runs one similarity search, and then holds until all
+workers are loaded. It then reports load time, first-query time, RSS and
+PSS. PSS (Linux only) splits shared pages between the processes that map
+them, so it shows how much of the memory-mapped index is really shared.
+
+    python benchmark_vector_store.py --workers 4
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+WORKER = r"""
+import json, os, sys, time
+fmt, hold = sys.argv[1], float(sys.argv[2])
+start = time.perf_counter()
+if fmt == "pickle":
+    import pickle
+    with open("vectors.pkl", "rb") as file:
+        vectors = pickle.load(file)
+else:
+    from langchain_community.embeddings import OllamaEmbeddings
+    from vector_store import load_store
+    vectors = load_store("vector_store", OllamaEmbeddings())
+load_s = time.perf_counter() - start
+
+import numpy as np
+query = np.random.default_rng(0).standard_normal(vectors.index.d).astype("float32").tolist()
+start = time.perf_counter()
+vectors.similarity_search_by_vector(query, k=4)
+query_s = time.perf_counter() - start
+
+time.sleep(hold)  # keep every worker alive at once so shared pages are shared
+mem = {}
+if os.path.exists("/proc/self/smaps_rollup"):
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("Rss", "Pss"):
+                mem[key.lower() + "_mb"] = int(value.split()[0]) / 1024
+print(json.dumps({"load_s": load_s, "first_query_s": query_s, **mem}))
+"""
+
+
+def run_format(fmt, workers, hold):
+    procs = [subprocess.Popen([sys.executable, "-c", WORKER, fmt, str(hold)], stdout=subprocess.PIPE, text=True)
+             for _ in range(workers)]
+    results = []
+    for proc in procs:
+        out, _ = proc.communicate()
+        if proc.returncode != 0:
+            raise RuntimeError(f"{fmt} worker failed")
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--hold", type=float, default=3.0, help="seconds each worker stays alive after loading")
+    args = parser.parse_args()
+
+    print(f"{'format':<8} {'load_s':>8} {'query_s':>8} {'rss_mb':>8} {'pss_mb':>8}   (mean of {args.workers} workers; pss total)")
+    for fmt in ("pickle", "native"):
+        results = run_format(fmt, args.workers, args.hold)
+        mean = lambda key: sum(r.get(key, 0.0) for r in results) / len(results)
+        pss_total = sum(r.get("pss_mb", 0.0) for r in results)
+        print(f"{fmt:<8} {mean('load_s'):>8.3f} {mean('first_query_s'):>8.3f} {mean('rss_mb'):>8.1f} {mean('pss_mb'):>8.1f}   ({pss_total:.1f})")
+
+
+if __name__ == "__main__":
+    main()
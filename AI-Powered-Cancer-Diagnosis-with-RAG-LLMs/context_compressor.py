@@ -0,0 +1,134 @@
+import threading
+
+import numpy as np
+from langchain_core.documents import Document
+
+from conversation_memory import estimate_tokens
+
+
+# Near-duplicate cut-off for the word-shingle fallback, used when stored vectors are unavailable
+TEXT_DUPLICATE_JACCARD = 0.8
+
+
+def _shingles(text, n=5):
+    words = text.lower().split()
+    return {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+
+
+def _overlap(a, b, min_overlap):
+    """Length of the longest suffix of `a` that is a prefix of `b` (0 if shorter than min_overlap)."""
+    for size in range(min(len(a), len(b)), min_overlap - 1, -1):
+        if a.endswith(b[:size]):
+            return size
+    return 0
+
+
+def _merge_pair(a, b, min_overlap):
+    if b in a:
+        return a
+    if a in b:
+        return b
+    size = _overlap(a, b, min_overlap)
+    if size:
+        return a + b[size:]
+    size = _overlap(b, a, min_overlap)
+    if size:
+        return b + a[size:]
+    return None
+
+
+class ContextCompressor:
+    """Post-retrieval clean-up before chunks are stuffed into the QA prompt.
+
+    1. Chunks whose stored vectors have cosine similarity of at least
+       `dedupe_threshold` with a higher-ranked chunk are dropped. The vectors
+       come from `lookup_vectors(docs)` (read back from the FAISS index), so
+       no embedding request is made at query time. If it returns None, a
+       local word-shingle Jaccard check is used instead.
+    2. Chunks from the same source page whose text overlaps (the splitter
+       uses chunk_overlap=200) or contains one another are merged into one.
+    3. Chunks are kept in retrieval order until `max_context_tokens` is used
+       up; the last one is cut to fit.
+    """
+
+    def __init__(self, lookup_vectors, max_context_tokens=1500, dedupe_threshold=0.95, min_overlap=40):
+        self.lookup_vectors = lookup_vectors
+        self.max_context_tokens = max_context_tokens
+        self.dedupe_threshold = dedupe_threshold
+        self.min_overlap = min_overlap
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.chunks_in = 0
+        self.chunks_out = 0
+        self.text_fallbacks = 0
+        self._lock = threading.Lock()
+
+    def merge_overlapping(self, docs):
+        merged = []
+        for doc in docs:
+            key = (doc.metadata.get("source"), doc.metadata.get("page"))
+            for i, kept in enumerate(merged):
+                if (kept.metadata.get("source"), kept.metadata.get("page")) != key:
+                    continue
+                text = _merge_pair(kept.page_content, doc.page_content, self.min_overlap)
+                if text is not None:
+                    merged[i] = Document(page_content=text, metadata=kept.metadata)
+                    break
+            else:
+                merged.append(doc)
+        # A merge can make two earlier chunks overlap, so repeat until stable
+        return merged if len(merged) == len(docs) else self.merge_overlapping(merged)
+
+    def drop_near_duplicates(self, docs):
+        if len(docs) < 2 or self.dedupe_threshold >= 1:
+            return docs
+        vectors = self.lookup_vectors(docs)
+        if vectors is None:
+            with self._lock:
+                self.text_fallbacks += 1
+            shingles = [_shingles(d.page_content) for d in docs]
+            similar = lambda i, j: len(shingles[i] & shingles[j]) / len(shingles[i] | shingles[j]) >= TEXT_DUPLICATE_JACCARD
+        else:
+            vectors = np.asarray(vectors, dtype="float32")
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            similar = lambda i, j: float(vectors[i] @ vectors[j]) >= self.dedupe_threshold
+        kept = []
+        for i in range(len(docs)):
+            if not any(similar(i, j) for j in kept):
+                kept.append(i)
+        return [docs[i] for i in kept]
+
+    def fit_budget(self, docs):
+        fitted, remaining = [], self.max_context_tokens
+        for doc in docs:
+            tokens = estimate_tokens(doc.page_content)
+            if tokens <= remaining:
+                fitted.append(doc)
+                remaining -= tokens
+                continue
+            if remaining > 50:
+                fitted.append(Document(page_content=doc.page_content[:remaining * 4], metadata=doc.metadata))
+            break
+        return fitted
+
+    def compress(self, docs):
+        docs = list(docs)
+        # Dedupe first: merged passages are new text with no stored vector
+        out = self.fit_budget(self.merge_overlapping(self.drop_near_duplicates(docs)))
+        with self._lock:
+            self.chunks_in += len(docs)
+            self.chunks_out += len(out)
+            self.tokens_in += sum(estimate_tokens(d.page_content) for d in docs)
+            self.tokens_out += sum(estimate_tokens(d.page_content) for d in out)
+        return out
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "chunks_in": self.chunks_in,
+                "chunks_out": self.chunks_out,
+                "context_tokens_in_est": self.tokens_in,
+                "context_tokens_out_est": self.tokens_out,
+                "saved_ratio": round(1 - self.tokens_out / self.tokens_in, 4) if self.tokens_in else 0.0,
+                "text_dedupe_fallbacks": self.text_fallbacks,
+            }
@@ -0,0 +1,196 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+
+def estimate_tokens(text):
+    # Llama 3 averages roughly 4 characters per token on English text
+    return max(1, len(text) // 4) if text else 0
+
+
+def messages_tokens(messages):
+    return sum(estimate_tokens(m.content) + 4 for m in messages)
+
+
+summary_prompt = (
+    "Condense the following conversation between a patient and an AI cancer doctor into a short summary "
+    "(at most {max_words} words). Keep diagnoses, symptoms, treatments and open questions; drop pleasantries.\n\n"
+    "Existing summary:\n{summary}\n\nNew turns:\n{turns}\n\nUpdated summary:"
+)
+
+
+class _Session:
+    def __init__(self):
+        self.summary = ""
+        self.turns = []
+        self.pending = []  # overflowed turns not yet folded into the summary
+        self.summarizing = False
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class ConversationMemory:
+    """Per-session chat history with a token budget.
+
+    The most recent turns are kept verbatim while they fit in
+    `max_history_tokens`. Older turns are folded into a rolling summary by
+    `llm`, which is sent as a single system message in front of the recent
+    turns. The summary is written on a background thread, so no request
+    waits for it; until it is ready the overflowed turns are still sent
+    verbatim; if summarizing keeps failing, the oldest of them are dropped
+    so they never take more than another `max_history_tokens`. Idle sessions expire after `session_ttl` seconds and at most
+    `max_sessions` are kept.
+    """
+
+    def __init__(self, llm, max_history_tokens=1000, summary_max_words=150, max_sessions=1000, session_ttl=3600):
+        self.llm = llm
+        self.max_history_tokens = max_history_tokens
+        self.summary_max_words = summary_max_words
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._summarizer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary")
+
+    def _session(self, session_id):
+        with self._lock:
+            now = time.monotonic()
+            while self._sessions:
+                oldest_id, oldest = next(iter(self._sessions.items()))
+                if len(self._sessions) < self.max_sessions and now - oldest.last_used < self.session_ttl:
+                    break
+                del self._sessions[oldest_id]
+            session = self._sessions.pop(session_id, None) or _Session()
+            session.last_used = now
+            self._sessions[session_id] = session
+            return session
+
+    def history(self, session_id):
+        """Messages to send as chat_history: rolling summary + recent turns."""
+        session = self._session(session_id)
+        with session.lock:
+            prefix = [SystemMessage(content=f"Summary of the earlier conversation: {session.summary}")] if session.summary else []
+            return prefix + list(session.pending) + list(session.turns)
+
+    def turns(self, session_id):
+        session = self._session(session_id)
+        with session.lock:
+            return list(session.turns)
+
+    def append(self, session_id, user_prompt, answer, on_summary=None):
+        """Record a finished turn. If older turns overflow the budget they are
+        summarized in the background; `on_summary(counter)` is then called with
+        the PromptTokenCounter of that summary call.
+        """
+        session = self._session(session_id)
+        with session.lock:
+            session.turns.extend([HumanMessage(content=user_prompt), AIMessage(content=answer)])
+            # Always keep the latest exchange verbatim, even if it alone exceeds the budget
+            while len(session.turns) > 2 and messages_tokens(session.turns) > self.max_history_tokens:
+                session.pending.extend(session.turns[:2])
+                del session.turns[:2]
+            start = bool(session.pending) and not session.summarizing
+            if start:
+                session.summarizing = True
+        if start:
+            self._summarizer.submit(self._summarize_pending, session, on_summary)
+
+    def _summarize_pending(self, session, on_summary):
+        while True:
+            with session.lock:
+                batch, summary = list(session.pending), session.summary
+                if not batch:
+                    session.summarizing = False
+                    return
+            counter = PromptTokenCounter()
+            try:
+                new_summary = self._summarize(summary, batch, counter)
+            except Exception as e:
+                # Pending turns stay verbatim and are retried after the next turn,
+                # but only as many as fit in the budget so a dead summarizer can't grow the prompt
+                print(f"Conversation summary failed: {e}")
+                with session.lock:
+                    while session.pending and messages_tokens(session.pending) > self.max_history_tokens:
+                        del session.pending[:2]
+                    session.summarizing = False
+                return
+            with session.lock:
+                session.summary = new_summary
+                del session.pending[:len(batch)]
+            if on_summary is not None:
+                on_summary(counter)
+
+    def _summarize(self, summary, messages, counter):
+        turns = "\n".join(f"{'Patient' if isinstance(m, HumanMessage) else 'Doctor'}: {m.content}" for m in messages)
+        prompt = summary_prompt.format(max_words=self.summary_max_words, summary=summary or "(none)", turns=turns)
+        return self.llm.invoke(prompt, config={"callbacks": [counter]}).content.strip()
+
+
+class PromptTokenCounter(BaseCallbackHandler):
+    """Collects the prompt/completion token usage Groq reports for each LLM call in one request.
+
+    Non-streamed calls report it in llm_output. Streamed calls have no
+    llm_output, so the usage_metadata of the accumulated message is read
+    instead. A call that reports neither is recorded as None and left out of
+    the averages rather than counted as zero.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens, completion_tokens = usage.get("prompt_tokens"), usage.get("completion_tokens")
+        if prompt_tokens is None:
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                    if metadata:
+                        prompt_tokens = (prompt_tokens or 0) + metadata.get("input_tokens", 0)
+                        completion_tokens = (completion_tokens or 0) + metadata.get("output_tokens", 0)
+        self.calls.append({"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens})
+
+    @property
+    def prompt_tokens(self):
+        if any(call["prompt_tokens"] is None for call in self.calls):
+            return None
+        return sum(call["prompt_tokens"] for call in self.calls)
+
+
+class TurnLog:
+    """Ring buffer of per-turn token and latency records for the /stats endpoint."""
+
+    def __init__(self, maxlen=200):
+        self.records = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def add_summary_usage(self, record, counter):
+        """Charge a background summary call to the turn that triggered it."""
+        with self._lock:
+            record["llm_calls"] = record.get("llm_calls", 0) + len(counter.calls)
+            record["summary_prompt_tokens"] = record.get("summary_prompt_tokens", 0) + (counter.prompt_tokens or 0)
+            if record.get("prompt_tokens") is not None and counter.prompt_tokens is not None:
+                record["prompt_tokens"] += counter.prompt_tokens
+
+    def snapshot(self):
+        with self._lock:
+            records = [dict(r) for r in self.records]
+        prompt_tokens = [r["prompt_tokens"] for r in records if r.get("prompt_tokens") is not None]
+        ttft = [r["ttft_s"] for r in records if r.get("ttft_s") is not None]
+        total = [r["total_s"] for r in records if r.get("total_s") is not None]
+        return {
+            "turns": len(records),
+            "mean_prompt_tokens": sum(prompt_tokens) / len(prompt_tokens) if prompt_tokens else 0,
+            "max_prompt_tokens": max(prompt_tokens, default=0),
+            "mean_ttft_s": round(sum(ttft) / len(ttft), 3) if ttft else None,
+            "mean_total_s": round(sum(total) / len(total), 3) if total else None,
+            "recent": records[-20:],
+        }
@@ -0,0 +1,140 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """Disk-backed cache in front of an Embeddings object, shared by
+    ingestion (embeddings.py) and the query path (app.py).
+
+    Vectors are stored in SQLite keyed by (model namespace, kind, sha256(text)).
+    `kind` keeps documents and queries apart because OllamaEmbeddings prefixes
+    them with different instructions. When the stored vectors exceed
+    `max_bytes`, the least recently used rows are evicted down to 90%.
+    """
+
+    def __init__(self, underlying, path="embedding_cache.sqlite", max_bytes=512 * 2**20, namespace=None):
+        self.underlying = underlying
+        self.path = path
+        self.max_bytes = max_bytes
+        # Model + server, so a stand-in benchmark server never poisons real vectors
+        self.namespace = namespace or f"{getattr(underlying, 'model', type(underlying).__name__)}@{getattr(underlying, 'base_url', '')}"
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        if not hasattr(self._local, "conn"):
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+            self._local.conn = conn
+        return self._local.conn
+
+    def _key(self, kind, text):
+        return hashlib.sha256(f"{self.namespace}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        """Batch lookup; returns {key: vector} for the keys that are cached."""
+        if not keys:
+            return {}
+        conn = self._conn()
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        for i in range(0, len(unique), 500):
+            batch = unique[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            for key, blob in conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch):
+                found[key] = np.frombuffer(blob, dtype="float32").tolist()
+        if found:
+            now = time.time()
+            conn.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, k) for k in found])
+            conn.commit()
+        return found
+
+    def put_many(self, items):
+        """Batch insert of (key, vector) pairs, then evict if over the size limit."""
+        if not items:
+            return
+        conn = self._conn()
+        now = time.time()
+        rows = []
+        for key, vector in items:
+            blob = np.asarray(vector, dtype="float32").tobytes()
+            rows.append((key, blob, len(blob), now))
+        conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, size, last_access) VALUES (?, ?, ?, ?)", rows)
+        conn.commit()
+        self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        freed, keys = 0, []
+        for key, size in conn.execute("SELECT key, size FROM embeddings ORDER BY last_access"):
+            keys.append(key)
+            freed += size
+            if total - freed <= target:
+                break
+        conn.executemany("DELETE FROM embeddings WHERE key = ?", [(k,) for k in keys])
+        conn.commit()
+        with self._lock:
+            self.evictions += len(keys)
+
+    def _embed(self, kind, texts, compute):
+        keys = [self._key(kind, t) for t in texts]
+        cached = self.get_many(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            vectors = compute(list(missing.values()))
+            fresh = list(zip(missing.keys(), vectors))
+            self.put_many(fresh)
+            cached.update(fresh)
+        return [list(cached[key]) for key in keys]
+
+    def embed_documents(self, texts):
+        return self._embed("doc", texts, self.underlying.embed_documents)
+
+    def embed_query(self, text):
+        return self._embed("query", [text], lambda texts: [self.underlying.embed_query(texts[0])])[0]
+
+    def stats(self):
+        conn = self._conn()
+        rows, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings").fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": rows,
+                "size_mb": round(size / 2**20, 2),
+                "max_mb": round(self.max_bytes / 2**20, 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+def cached_embeddings(underlying):
+    return CachedEmbeddings(
+        underlying,
+        path=os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite"),
+        max_bytes=int(float(os.getenv("EMBEDDING_CACHE_MAX_MB", "512")) * 2**20),
+    )
@@ -1,35 +1,215 @@
 import os
-from langchain_groq import ChatGroq
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from langchain_community.embeddings import OllamaEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_core.prompts import ChatPromptTemplate
 from langchain_community.vectorstores import FAISS
-from dotenv import load_dotenv
-import pickle  # For saving/loading embeddings
+import pickle  # Only for migrating an old vectors.pkl
 from langchain_community.document_loaders import PyPDFLoader
-
-
-embeddings = OllamaEmbeddings()
-
-def load_pdfs_from_directory(directory_path):
-    docs = []
-    # Loop through all files in the directory
-    for filename in os.listdir(directory_path):
-        if filename.endswith(".pdf"):  # Check if the file is a PDF
-            filepath = os.path.join(directory_path, filename)
-            loader = PyPDFLoader(filepath)  # Load each PDF file
-            docs.extend(loader.load())  # Append to the list of documents
-    return docs
+from vector_store import store_exists, save_store, load_store_for_update, store_lock, load_manifest as load_store_manifest
+from embedding_cache import cached_embeddings
 
 # Replace with your actual folder path
 directory_path = "research_papers"
-documents = load_pdfs_from_directory(directory_path)
+# Native FAISS index + SQLite docstore (see vector_store.py); vectors.pkl is the old pickle format
+store_dir = "vector_store"
+legacy_vectors_path = "vectors.pkl"
+# Maps each PDF to its content hash and the ids of its chunks in the vector store.
+# Saved inside the store version; this file is only read for stores built before that
+manifest_path = "vectors_manifest.json"
 
-# Continue with text splitting and embeddings
+# Disk-backed cache shared with app.py: unchanged chunks are never re-embedded
+embeddings = cached_embeddings(OllamaEmbeddings())
 text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-final_documents = text_splitter.split_documents(documents[:50])  # Corrected to use 'documents'
-vectors = FAISS.from_documents(final_documents, embeddings)
 
-# Save the embeddings
-with open("vectors.pkl", "wb") as file:
-    pickle.dump(vectors, file)
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def list_pdfs(directory_path):
+    return sorted(f for f in os.listdir(directory_path) if f.endswith(".pdf"))
+
+
+# Runs in a worker process: parse + split one PDF
+def parse_pdf(filepath):
+    pages = PyPDFLoader(filepath).load()
+    return len(pages), text_splitter.split_documents(pages)
+
+
+class IngestStats:
+    def __init__(self, total_files):
+        self.total_files = total_files
+        self.files = 0
+        self.pages = 0
+        self.chunks = 0
+        self.start = time.perf_counter()
+
+    def add(self, pages, chunks):
+        self.files += 1
+        self.pages += pages
+        self.chunks += chunks
+
+    def report(self):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return (f"[{self.files}/{self.total_files}] {self.pages} pages, {self.chunks} chunks in {elapsed:.1f}s | "
+                f"{self.pages / elapsed:.1f} pages/s, {self.chunks / elapsed:.1f} chunks/s")
+
+
+def embed_pipeline(filepaths, parse_workers=None, embed_concurrency=4, embed_batch_size=32):
+    """Parse PDFs in a process pool and stream their chunks into a bounded,
+    batched embedding stage.
+
+    Yields (filepath, page_count, chunks, chunk_vectors) per file as soon as
+    all of its batches are embedded. At most two PDFs per parse worker are
+    submitted at a time, and at most `embed_concurrency` batches run at once
+    with at most twice that queued, so parsing cannot run far ahead of the
+    embedding server.
+    """
+    slots = threading.Semaphore(embed_concurrency * 2)
+    pending = {}
+
+    def submit_batches(embedders, chunks):
+        futures = []
+        for i in range(0, len(chunks), embed_batch_size):
+            slots.acquire()
+            future = embedders.submit(embeddings.embed_documents, [c.page_content for c in chunks[i:i + embed_batch_size]])
+            future.add_done_callback(lambda _: slots.release())
+            futures.append(future)
+        return futures
+
+    def finished(wait=False):
+        for filepath in list(pending):
+            page_count, chunks, futures = pending[filepath]
+            if wait or all(f.done() for f in futures):
+                del pending[filepath]
+                yield filepath, page_count, chunks, [v for f in futures for v in f.result()]
+
+    with ProcessPoolExecutor(max_workers=parse_workers) as parsers, ThreadPoolExecutor(max_workers=embed_concurrency) as embedders:
+        # Submit the next PDF only as one finishes, so parsed chunks never pile up in memory
+        to_parse = iter(filepaths)
+        window = (parse_workers or os.cpu_count() or 1) * 2
+        parse_futures = {}
+        for filepath in to_parse:
+            parse_futures[parsers.submit(parse_pdf, filepath)] = filepath
+            if len(parse_futures) >= window:
+                break
+        while parse_futures:
+            done, _ = wait(parse_futures, return_when=FIRST_COMPLETED)
+            for parsed in done:
+                filepath = parse_futures.pop(parsed)
+                next_filepath = next(to_parse, None)
+                if next_filepath is not None:
+                    parse_futures[parsers.submit(parse_pdf, next_filepath)] = next_filepath
+                page_count, chunks = parsed.result()
+                pending[filepath] = (page_count, chunks, submit_batches(embedders, chunks))
+                yield from finished()
+        yield from finished(wait=True)
+
+
+def load_manifest():
+    manifest = load_store_manifest(store_dir) if store_exists(store_dir) else None
+    if manifest is not None:
+        return manifest
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def manifest_matches(manifest, vectors):
+    manifest_ids = {chunk_id for entry in manifest.values() for chunk_id in entry["chunk_ids"]}
+    return manifest_ids == set(vectors.index_to_docstore_id.values())
+
+
+def load_vectors():
+    if store_exists(store_dir):
+        return load_store_for_update(store_dir, embeddings)
+    if os.path.exists(legacy_vectors_path):
+        with open(legacy_vectors_path, "rb") as file:
+            return pickle.load(file)
+    return None
+
+
+def save(vectors, manifest):
+    # Same lock as the app's one-time pickle migration, so the two never interleave
+    with store_lock(store_dir):
+        save_store(vectors, store_dir, manifest=manifest)
+
+
+def ingest(directory_path, parse_workers=None, embed_concurrency=4, embed_batch_size=32):
+    """Embed only new or changed PDFs and drop vectors of deleted ones."""
+    manifest = load_manifest()
+    # Without both a manifest and a store the chunk ids are unknown, so start from scratch
+    vectors = load_vectors() if manifest else None
+    # A legacy manifest can be out of step with the store (e.g. a crash between
+    # the two writes); its chunk ids would then collide or go stale
+    if vectors is not None and not manifest_matches(manifest, vectors):
+        print("Manifest does not match the vector store; rebuilding from scratch.")
+        vectors = None
+    if vectors is None:
+        manifest = {}
+
+    current = {filename: file_sha256(os.path.join(directory_path, filename)) for filename in list_pdfs(directory_path)}
+    removed = [f for f in manifest if f not in current]
+    changed = [f for f, sha in current.items() if f in manifest and manifest[f]["sha256"] != sha]
+    added = [f for f in current if f not in manifest]
+
+    stale_ids = [chunk_id for f in removed + changed for chunk_id in manifest[f]["chunk_ids"]]
+    if vectors is not None and stale_ids:
+        vectors.delete(stale_ids)
+    for f in removed + changed:
+        del manifest[f]
+
+    to_embed = changed + added
+    stats = IngestStats(len(to_embed))
+    filepaths = [os.path.join(directory_path, filename) for filename in to_embed]
+    for filepath, page_count, chunks, chunk_vectors in embed_pipeline(filepaths, parse_workers, embed_concurrency, embed_batch_size):
+        filename = os.path.basename(filepath)
+        sha = current[filename]
+        # Include the file name so two identical PDFs never collide on ids
+        prefix = hashlib.sha256(f"{filename}:{sha}".encode("utf-8")).hexdigest()[:16]
+        chunk_ids = [f"{prefix}-{i}" for i in range(len(chunks))]
+        if chunks:
+            text_embeddings = list(zip([c.page_content for c in chunks], chunk_vectors))
+            metadatas = [c.metadata for c in chunks]
+            if vectors is None:
+                vectors = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=chunk_ids)
+            else:
+                vectors.add_embeddings(text_embeddings, metadatas=metadatas, ids=chunk_ids)
+        manifest[filename] = {"sha256": sha, "chunk_ids": chunk_ids}
+        stats.add(page_count, len(chunks))
+        print(f"{stats.report()} | {filename}")
+
+    print(f"Added {len(added)}, changed {len(changed)}, removed {len(removed)}, "
+          f"unchanged {len(current) - len(added) - len(changed)} PDFs")
+
+    if vectors is None:
+        print("No documents to index.")
+        return None
+    if added or changed or removed or not store_exists(store_dir):
+        save(vectors, manifest)
+    return vectors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally embed research_papers into the FAISS store")
+    parser.add_argument("--directory", default=directory_path)
+    parser.add_argument("--parse-workers", type=int, default=None, help="PDF parsing processes (default: CPU count)")
+    parser.add_argument("--embed-concurrency", type=int, default=4, help="embedding batches in flight")
+    parser.add_argument("--embed-batch-size", type=int, default=32, help="chunks per embedding request batch")
+    parser.add_argument("--ollama-url", default=None, help="embedding server, e.g. the local stand-in at http://localhost:11435")
+    args = parser.parse_args()
+
+    if args.ollama_url:
+        embeddings = cached_embeddings(OllamaEmbeddings(base_url=args.ollama_url))
+    ingest(args.directory, args.parse_workers, args.embed_concurrency, args.embed_batch_size)
+    print(f"Embedding cache: {embeddings.stats()}")
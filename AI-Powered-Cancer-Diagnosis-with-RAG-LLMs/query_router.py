@@ -0,0 +1,103 @@
+import re
+import threading
+
+# Words that usually point back at something said earlier in the chat
+REFERENCE_WORDS = {
+    "it", "its", "it's", "they", "them", "their", "theirs",
+    "he", "she", "him", "his", "her", "hers", "former", "latter",
+    "this", "these", "those",
+}
+# Phrases that explicitly point back at an earlier answer
+REFERENCE_PHRASES = (
+    "you mentioned", "you said", "you suggested", "you recommended", "mentioned",
+    "earlier", "above", "previous", "the same",
+)
+# Only refer back when they end the question ("which one is better, the first one?", "is it always such?")
+TRAILING_REFERENCE_WORDS = {"one", "ones", "such", "same"}
+FOLLOW_UP_OPENERS = (
+    "and ", "also ", "but ", "so ", "then ", "what about", "how about", "why", "what else",
+    "anything else", "more ", "tell me more", "explain more", "and?",
+)
+BE_VERBS = {"is", "are", "was", "were", "isn't", "aren't", "be"}
+# Words after which "that" is not a relative pronoun ("of that drug", "is that serious")
+FUNCTION_WORDS = BE_VERBS | {
+    "do", "does", "did", "can", "could", "will", "would", "should", "may", "might",
+    "of", "about", "for", "with", "on", "in", "to", "from", "like", "at", "by", "after", "before",
+    "and", "or", "but", "how", "what", "why", "when", "where", "which", "than", "all",
+}
+# Verbs that typically follow a relative "that" ("cancer that has spread")
+RELATIVE_VERBS = BE_VERBS | {
+    "has", "have", "had", "can", "could", "may", "might", "will", "would", "does", "do",
+    "cause", "causes", "spread", "spreads", "affect", "affects", "help", "helps",
+    "grow", "grows", "develop", "develops", "occur", "occurs", "start", "starts", "respond", "responds",
+}
+
+
+def _refers_back(words, i):
+    """Whether "that" / "there" at position i points back at the conversation."""
+    word = words[i]
+    prev = words[i - 1] if i > 0 else None
+    nxt = words[i + 1] if i + 1 < len(words) else None
+    if word == "that":
+        # Relative "that": noun + that + verb ("lung cancer that has spread")
+        return not (prev is not None and prev not in FUNCTION_WORDS and nxt in RELATIVE_VERBS)
+    # Existential "there": "is there a cure", "there are options"
+    return prev not in BE_VERBS and nxt not in BE_VERBS
+
+
+def needs_rewrite(question, chat_history):
+    """Cheap local check: does this question need the chat history to be understood?
+
+    No history means nothing to resolve. Otherwise very short questions,
+    follow-up openers ("what about...", "and..."), pronouns and determiners
+    ("it", "they", "this", "those") and phrases like "you mentioned" are
+    treated as ambiguous. "that" and "there" count too, except as a relative
+    pronoun ("cancer that has spread") or existential ("is there a cure").
+    Anything else is assumed to be self-contained.
+    """
+    if not chat_history:
+        return False
+    q = question.strip().lower()
+    words = re.findall(r"[a-z']+", q)
+    if len(words) <= 3:
+        return True
+    if q.startswith(FOLLOW_UP_OPENERS):
+        return True
+    if any(word in REFERENCE_WORDS for word in words):
+        return True
+    padded = f" {' '.join(words)} "
+    if any(f" {phrase} " in padded for phrase in REFERENCE_PHRASES):
+        return True
+    if any(word in ("that", "there") and _refers_back(words, i) for i, word in enumerate(words)):
+        return True
+    return words[-1] in TRAILING_REFERENCE_WORDS
+
+
+class RewriteStats:
+    def __init__(self):
+        self.rewritten = 0
+        self.skipped_no_history = 0
+        self.skipped_standalone = 0
+        self._lock = threading.Lock()
+
+    def record(self, question, chat_history):
+        rewrite = needs_rewrite(question, chat_history)
+        with self._lock:
+            if rewrite:
+                self.rewritten += 1
+            elif not chat_history:
+                self.skipped_no_history += 1
+            else:
+                self.skipped_standalone += 1
+        return rewrite
+
+    def snapshot(self):
+        with self._lock:
+            skipped = self.skipped_no_history + self.skipped_standalone
+            total = skipped + self.rewritten
+            return {
+                "rewritten": self.rewritten,
+                "skipped_no_history": self.skipped_no_history,
+                "skipped_standalone": self.skipped_standalone,
+                "skip_rate": round(skipped / total, 4) if total else 0.0,
+            }
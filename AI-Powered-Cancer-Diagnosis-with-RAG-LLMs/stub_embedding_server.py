@@ -0,0 +1,78 @@
+"""Local stand-in for Ollama's embedding API, for benchmarking ingestion.
+
+Returns deterministic pseudo-random vectors (seeded by the text) after a
+configurable delay, and limits how many requests it serves at once to mimic
+a single model instance.
+
+    python stub_embedding_server.py --port 11435 --latency-ms 20 --parallel 4
+    python embeddings.py --ollama-url http://localhost:11435 --embed-concurrency 8
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_embedding(text, dim):
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    return [rng.gauss(0, 1) for _ in range(dim)]
+
+
+class EmbeddingHandler(BaseHTTPRequestHandler):
+    dim = 4096
+    latency = 0.02
+    slots = threading.Semaphore(4)
+    served = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path == "/api/embeddings":
+            texts = [body.get("prompt", "")]
+        elif self.path == "/api/embed":
+            texts = body.get("input", [])
+            texts = [texts] if isinstance(texts, str) else texts
+        else:
+            self.send_error(404)
+            return
+
+        with EmbeddingHandler.slots:
+            time.sleep(self.latency * len(texts))
+            vectors = [fake_embedding(t, self.dim) for t in texts]
+            EmbeddingHandler.served += len(texts)
+
+        if self.path == "/api/embeddings":
+            payload = {"embedding": vectors[0]}
+        else:
+            payload = {"model": body.get("model"), "embeddings": vectors}
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--dim", type=int, default=4096)
+    parser.add_argument("--latency-ms", type=float, default=20, help="simulated model time per text")
+    parser.add_argument("--parallel", type=int, default=4, help="requests processed at once")
+    args = parser.parse_args()
+
+    EmbeddingHandler.dim = args.dim
+    EmbeddingHandler.latency = args.latency_ms / 1000
+    EmbeddingHandler.slots = threading.Semaphore(args.parallel)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), EmbeddingHandler)
+    print(f"Stand-in embedding server on http://127.0.0.1:{args.port} (dim={args.dim})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"Served {EmbeddingHandler.served} embeddings")
@@ -0,0 +1,294 @@
+"""Native on-disk format for the FAISS vector store.
+
+    vector_store/CURRENT                    - name of the active version directory
+    vector_store/<version>/index.faiss      - faiss.write_index output
+    vector_store/<version>/docstore.sqlite  - one row per vector: position, chunk id, text, metadata
+    vector_store/<version>/meta.json        - distance strategy / normalization flags
+    vector_store/<version>/manifest.json    - ingestion manifest (PDF -> hash, chunk ids), if any
+
+Every save builds a complete new version directory and then points CURRENT
+at it with one atomic rename, so a reader never sees a new docstore next to
+an old index, and the ingestion manifest always matches the chunks next
+to it. Running workers keep serving the version they loaded at
+startup until they are restarted: load_store opens the index and the
+docstore up front, so pruning the directory (only the last KEEP_VERSIONS
+versions are kept on disk) does not pull the files out from under them.
+Stores written before versioning (files directly in vector_store/)
+are still read.
+
+The app opens the index memory-mapped and reads chunks from SQLite on
+demand, so worker processes share the index pages through the OS page
+cache instead of each unpickling a private copy. Ingestion loads a fully
+in-memory, mutable store instead (see load_store_for_update).
+"""
+import fcntl
+import json
+import os
+import pickle
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+import faiss
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+
+INDEX_NAME = "index.faiss"
+DOCSTORE_NAME = "docstore.sqlite"
+META_NAME = "meta.json"
+MANIFEST_NAME = "manifest.json"
+CURRENT_NAME = "CURRENT"
+KEEP_VERSIONS = 3
+
+
+def _write_atomic(path, text):
+    tmp = f"{path}.tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def active_dir(store_dir):
+    """Directory holding the files of the current version (or store_dir for the old flat layout)."""
+    current = os.path.join(store_dir, CURRENT_NAME)
+    if os.path.exists(current):
+        with open(current, "r", encoding="utf-8") as f:
+            return os.path.join(store_dir, f.read().strip())
+    return store_dir
+
+
+def store_exists(store_dir):
+    directory = active_dir(store_dir)
+    return all(os.path.exists(os.path.join(directory, name)) for name in (INDEX_NAME, DOCSTORE_NAME, META_NAME))
+
+
+@contextmanager
+def store_lock(store_dir):
+    """Exclusive inter-process lock for writers of `store_dir` (ingestion, pickle migration)."""
+    os.makedirs(store_dir, exist_ok=True)
+    with open(os.path.join(store_dir, ".lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _prune_versions(store_dir, current, keep):
+    versions = sorted(name for name in os.listdir(store_dir)
+                      if name.startswith("v") and os.path.isdir(os.path.join(store_dir, name)))
+    for name in versions[:-keep]:
+        if name != current:
+            shutil.rmtree(os.path.join(store_dir, name), ignore_errors=True)
+
+
+def save_store(vectors, store_dir, manifest=None):
+    """Write a LangChain FAISS store in the native format as a new version, then switch to it atomically.
+
+    `manifest` (embeddings.py's PDF -> hash/chunk ids map) is stored in the
+    same version, so it is committed by the same CURRENT switch as the chunks.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    # Sorts by creation time and is unique per writer, so concurrent builds never share files
+    version = f"v{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+    directory = os.path.join(store_dir, version)
+    os.makedirs(directory)
+
+    conn = sqlite3.connect(os.path.join(directory, DOCSTORE_NAME))
+    conn.execute("CREATE TABLE chunks (pos INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, page_content TEXT NOT NULL, metadata TEXT NOT NULL)")
+    rows = []
+    for pos, chunk_id in sorted(vectors.index_to_docstore_id.items()):
+        doc = vectors.docstore.search(chunk_id)
+        rows.append((pos, chunk_id, doc.page_content, json.dumps(doc.metadata)))
+    conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+    faiss.write_index(vectors.index, os.path.join(directory, INDEX_NAME))
+
+    meta = {
+        "distance_strategy": getattr(vectors.distance_strategy, "value", vectors.distance_strategy),
+        "normalize_L2": bool(getattr(vectors, "_normalize_L2", False)),
+        "count": len(rows),
+    }
+    _write_atomic(os.path.join(directory, META_NAME), json.dumps(meta, indent=2))
+    if manifest is not None:
+        _write_atomic(os.path.join(directory, MANIFEST_NAME), json.dumps(manifest, indent=2))
+
+    # The switch: readers see either the old version or the complete new one
+    _write_atomic(os.path.join(store_dir, CURRENT_NAME), version)
+    _prune_versions(store_dir, version, KEEP_VERSIONS)
+
+
+def convert_pickle(pickle_path, store_dir):
+    with open(pickle_path, "rb") as file:
+        save_store(pickle.load(file), store_dir)
+
+
+def migrate_pickle(pickle_path, store_dir):
+    """One-time pickle -> native conversion, safe when several workers start at once.
+
+    The first worker converts under the store lock; the others wait for it
+    and then find the store already there.
+    """
+    with store_lock(store_dir):
+        if not store_exists(store_dir):
+            convert_pickle(pickle_path, store_dir)
+
+
+def _read_meta(directory):
+    with open(os.path.join(directory, META_NAME), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_manifest(store_dir):
+    """Manifest saved with the current version, or None if it was saved without one."""
+    path = os.path.join(active_dir(store_dir), MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _read_index_mmap(path):
+    # IO_FLAG_MMAP_IFC maps flat codes (IndexFlat*) on newer faiss; IO_FLAG_MMAP covers IVF lists
+    flags = [getattr(faiss, "IO_FLAG_MMAP_IFC", None), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY]
+    for flag in flags:
+        if flag is None:
+            continue
+        try:
+            return faiss.read_index(path, flag)
+        except RuntimeError:
+            continue
+    return faiss.read_index(path)
+
+
+class _SQLiteReader:
+    """One read-only connection, opened eagerly and shared by all request threads.
+
+    Holding the file open keeps this version's data readable even after a
+    later save prunes its directory (the unlinked file lives on until the
+    connection closes), so a running worker is never left without a store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def fetchone(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def fetchall(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+
+class SQLiteDocstore(Docstore):
+    """Read-only docstore that fetches chunks by id from docstore.sqlite."""
+
+    def __init__(self, reader):
+        self._reader = reader
+
+    def search(self, search):
+        row = self._reader.fetchone("SELECT page_content, metadata FROM chunks WHERE id = ?", (search,))
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def delete(self, ids):
+        raise NotImplementedError("SQLiteDocstore is read-only; rebuild with embeddings.py")
+
+
+class SQLitePositionMap(Mapping):
+    """index_to_docstore_id backed by SQLite instead of a dict in every worker."""
+
+    def __init__(self, reader):
+        self._reader = reader
+
+    def __getitem__(self, pos):
+        row = self._reader.fetchone("SELECT id FROM chunks WHERE pos = ?", (int(pos),))
+        if row is None:
+            raise KeyError(pos)
+        return row[0]
+
+    def __iter__(self):
+        for (pos,) in self._reader.fetchall("SELECT pos FROM chunks ORDER BY pos"):
+            yield pos
+
+    def __len__(self):
+        return self._reader.fetchone("SELECT COUNT(*) FROM chunks")[0]
+
+    def position(self, chunk_id):
+        row = self._reader.fetchone("SELECT pos FROM chunks WHERE id = ?", (chunk_id,))
+        return row[0] if row else None
+
+
+def stored_vectors(vectors, docs):
+    """Vectors of retrieved chunks read back from the FAISS index, so nothing is re-embedded.
+
+    Returns None when a chunk has no id or the index cannot reconstruct it
+    (e.g. an IVF index without a direct map).
+    """
+    id_map = vectors.index_to_docstore_id
+    positions = []
+    for doc in docs:
+        chunk_id = getattr(doc, "id", None)
+        if chunk_id is None:
+            return None
+        if isinstance(id_map, SQLitePositionMap):
+            pos = id_map.position(chunk_id)
+        else:
+            pos = next((p for p, cid in id_map.items() if cid == chunk_id), None)
+        if pos is None:
+            return None
+        positions.append(int(pos))
+    try:
+        return np.stack([vectors.index.reconstruct(pos) for pos in positions])
+    except RuntimeError:
+        return None
+
+
+def load_store(store_dir, embeddings):
+    """Read-only store for serving: memory-mapped index + on-demand SQLite docstore."""
+    directory = active_dir(store_dir)
+    meta = _read_meta(directory)
+    # Both files are opened here, at load time: the mmapped index and the open
+    # SQLite connection stay valid even if this version is pruned later
+    reader = _SQLiteReader(os.path.join(directory, DOCSTORE_NAME))
+    return FAISS(
+        embedding_function=embeddings,
+        index=_read_index_mmap(os.path.join(directory, INDEX_NAME)),
+        docstore=SQLiteDocstore(reader),
+        index_to_docstore_id=SQLitePositionMap(reader),
+        normalize_L2=meta["normalize_L2"],
+        distance_strategy=DistanceStrategy(meta["distance_strategy"]),
+    )
+
+
+def load_store_for_update(store_dir, embeddings):
+    """Fully in-memory, mutable store for ingestion (supports add/delete by id)."""
+    directory = active_dir(store_dir)
+    meta = _read_meta(directory)
+    conn = sqlite3.connect(f"file:{os.path.join(directory, DOCSTORE_NAME)}?mode=ro", uri=True)
+    rows = conn.execute("SELECT pos, id, page_content, metadata FROM chunks ORDER BY pos").fetchall()
+    conn.close()
+    return FAISS(
+        embedding_function=embeddings,
+        index=faiss.read_index(os.path.join(directory, INDEX_NAME)),
+        docstore=InMemoryDocstore({cid: Document(page_content=text, metadata=json.loads(md)) for _, cid, text, md in rows}),
+        index_to_docstore_id={pos: cid for pos, cid, _, _ in rows},
+        normalize_L2=meta["normalize_L2"],
+        distance_strategy=DistanceStrategy(meta["distance_strategy"]),
+    )
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def config_key(config):
+    """Stable digest of a connection config, so credentials are never used as dict keys."""
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    def __init__(self):
+        self.value = None
+        self.error = None
+        self.ready = threading.Event()
+        self.last_used = time.monotonic()
+
+
+class AgentCache:
+    """Keyed cache of per-database resources (engine, SQLDatabase, LLM, agent).
+
+    `build(config)` runs once per distinct config, even when several requests
+    for the same config arrive together; the others wait for it. Entries
+    unused for `idle_ttl` seconds, and the least recently used ones beyond
+    `max_entries`, are passed to `close` (which should dispose the engine's
+    connection pool). A failed build is not cached.
+    """
+
+    def __init__(self, build, close, max_entries=16, idle_ttl=1800):
+        self.build = build
+        self.close = close
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self.hits = 0
+        self.builds = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        # Called with self._lock held; returns the values to close outside the lock
+        evicted = []
+        while self._entries:
+            key, oldest = next(iter(self._entries.items()))
+            if len(self._entries) < self.max_entries and now - oldest.last_used < self.idle_ttl:
+                break
+            if not oldest.ready.is_set():
+                break
+            del self._entries[key]
+            if oldest.value is not None:
+                evicted.append(oldest.value)
+        self.evictions += len(evicted)
+        return evicted
+
+    def get(self, config):
+        key = config_key(config)
+        with self._lock:
+            now = time.monotonic()
+            evicted = self._evict(now)
+            entry = self._entries.pop(key, None)
+            owner = entry is None
+            if owner:
+                entry = _Entry()
+                self.builds += 1
+            else:
+                self.hits += 1
+            entry.last_used = now
+            self._entries[key] = entry
+        for value in evicted:
+            self.close(value)
+
+        if owner:
+            try:
+                entry.value = self.build(config)
+            except Exception as e:
+                entry.error = e
+                with self._lock:
+                    if self._entries.get(key) is entry:
+                        del self._entries[key]
+                raise
+            finally:
+                entry.ready.set()
+        else:
+            entry.ready.wait()
+            if entry.error is not None:
+                raise entry.error
+        return entry.value
+
+    def invalidate(self, config):
+        with self._lock:
+            entry = self._entries.pop(config_key(config), None)
+        if entry is not None and entry.ready.is_set() and entry.value is not None:
+            self.close(entry.value)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "builds": self.builds,
+                "evictions": self.evictions,
+            }
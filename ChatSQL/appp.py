@@ -1,16 +1,179 @@
-from flask import Flask, render_template, request, redirect, url_for, session
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify
 from pathlib import Path
+import os
+import time
 from langchain.agents import create_sql_agent
 from langchain.sql_database import SQLDatabase
 from langchain.agents.agent_types import AgentType
 from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
 import sqlite3
 from langchain_groq import ChatGroq
 from langchain.agents.agent_toolkits import SQLDatabaseToolkit  # Make sure this import is here
+from agent_cache import AgentCache, config_key
+from schema_digest import SchemaDigest
+from fast_sql import LLMCallCounter, PathStats, answer_fast, format_answer
+from result_cache import DEFAULT_MYSQL_FINGERPRINT_SQL, ResultCache, query_fingerprint, sqlite_fingerprint
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'
 
+LOCAL_DB_PATH = (Path(__file__).parent / "student.db").absolute()
+
+
+def configure_db(db_uri, mysql_host=None, mysql_user=None, mysql_password=None, mysql_db=None):
+    if db_uri == "USE_LOCALDB":
+        dbfilepath = LOCAL_DB_PATH
+        # Read-only file connections may be shared between request threads
+        creator = lambda: sqlite3.connect(f"file:{dbfilepath}?mode=ro", uri=True, check_same_thread=False)
+        engine = create_engine("sqlite://", creator=creator, poolclass=QueuePool, pool_size=5, max_overflow=5)
+    elif db_uri == "USE_MYSQL":
+        if not (mysql_host and mysql_user and mysql_password and mysql_db):
+            return None
+        engine = create_engine(
+            f"mysql+mysqlconnector://{mysql_user}:{mysql_password}@{mysql_host}/{mysql_db}",
+            pool_size=5, max_overflow=10,
+            pool_pre_ping=True,   # drop connections the server closed while idle
+            pool_recycle=1800,    # stay under MySQL's wait_timeout
+        )
+    else:
+        return None
+    return SQLDatabase(engine)
+
+
+# Default SQL agent prompt, plus permission to trust the schema digest we put
+# in the input instead of spending tool calls on list_tables / schema
+SQL_AGENT_PREFIX = """You are an agent designed to interact with a SQL database.
+Given an input question, create a syntactically correct {dialect} query to run, then look at the results of the query and return the answer.
+Unless the user specifies a specific number of examples they wish to obtain, always limit your query to at most {top_k} results.
+You can order the results by a relevant column to return the most interesting examples in the database.
+Never query for all the columns from a specific table, only ask for the relevant columns given the question.
+You have access to tools for interacting with the database.
+Only use the below tools and the schema digest given with the question to construct your final answer.
+The question may come with a schema digest of the relevant tables (columns, types, keys, row counts and sample values). When it does, do not call sql_db_list_tables or sql_db_schema for those tables; write the query from the digest directly.
+You MUST double check your query before executing it. If you get an error while executing a query, rewrite the query and try again.
+
+DO NOT make any DML statements (INSERT, UPDATE, DELETE, DROP etc.) to the database.
+
+If the question does not seem related to the database, just return "I don't know" as the answer.
+"""
+
+SCHEMA_MAX_TABLES = int(os.getenv("SCHEMA_MAX_TABLES", "5"))
+# Try a single LLM call for the SQL before the ReAct agent
+SQL_FAST_PATH = os.getenv("SQL_FAST_PATH", "1") == "1"
+path_stats = PathStats()
+
+
+class DatabaseAgent:
+    """Everything built once per (database, credentials, API key) and shared by requests."""
+
+    def __init__(self, llm, db, agent, digest):
+        self.llm = llm
+        self.db = db
+        self.agent = agent
+        self.digest = digest
+
+
+def build_agent(config):
+    # Initialize the LLM model
+    llm = ChatGroq(groq_api_key=config['api_key'], model_name="Llama3-8b-8192", streaming=True)
+    print("LLM initialized successfully")
+
+    # Database configuration (reflects the schema once per cached entry)
+    db = configure_db(config['db_uri'], config['mysql_host'], config['mysql_user'],
+                      config['mysql_password'], config['mysql_db'])
+    if not db:
+        raise ValueError("Database connection failed. Please check your database credentials.")
+    print("Database configured successfully")
+
+    try:
+        digest = SchemaDigest.build(db._engine)
+        print(f"Schema digest built for {len(digest.tables)} tables")
+    except Exception as e:
+        # The agent can still discover the schema through its tools
+        print(f"Error building the schema digest: {e}")
+        digest = None
+
+    # Initialize the SQLDatabaseToolkit
+    toolkit = SQLDatabaseToolkit(db=db, llm=llm)
+    agent = create_sql_agent(
+        llm=llm,
+        toolkit=toolkit,
+        verbose=True,
+        agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+        prefix=SQL_AGENT_PREFIX,
+    )
+    print("Agent initialized successfully")
+    return DatabaseAgent(llm, db, agent, digest)
+
+
+def close_agent(resources):
+    resources.db._engine.dispose()
+
+
+# Engines, toolkits and agents are reused across requests with the same
+# connection settings; idle ones are dropped and their pools closed
+agents = AgentCache(
+    build_agent,
+    close_agent,
+    max_entries=int(os.getenv("AGENT_CACHE_MAX_ENTRIES", "16")),
+    idle_ttl=int(os.getenv("AGENT_CACHE_IDLE_SECONDS", "1800")),
+)
+
+
+def relevant_digest(question, resources):
+    """Digest of only the tables a local keyword ranker picked for the question, or None."""
+    if resources.digest is None:
+        return None
+    tables = resources.digest.relevant_tables(question, max_tables=SCHEMA_MAX_TABLES)
+    if not tables:
+        return None
+    print(f"Relevant tables: {', '.join(tables)} (of {len(resources.digest.tables)})")
+    return resources.digest.describe(tables)
+
+
+def agent_input(question, digest_text):
+    if digest_text is None:
+        return question
+    return f"{question}\n\nSchema digest of the relevant tables:\n{digest_text}"
+
+
+# Answers to repeated questions, keyed on the database version: file mtime/size
+# for SQLite, a hash of MYSQL_FINGERPRINT_SQL's rows (the schema by default) for MySQL
+result_cache = ResultCache(
+    max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024")),
+    max_bytes=int(float(os.getenv("RESULT_CACHE_MAX_MB", "32")) * 2**20),
+    ttl_seconds=int(os.getenv("RESULT_CACHE_TTL_SECONDS", "600")),
+)
+MYSQL_FINGERPRINT_SQL = os.getenv("MYSQL_FINGERPRINT_SQL", DEFAULT_MYSQL_FINGERPRINT_SQL)
+
+
+def database_id(config):
+    # The API key does not change what the database contains
+    return config_key({k: v for k, v in config.items() if k != 'api_key'})
+
+
+def database_fingerprint(config, resources):
+    try:
+        if config['db_uri'] == "USE_LOCALDB":
+            return sqlite_fingerprint(LOCAL_DB_PATH)
+        return query_fingerprint(resources.db._engine, MYSQL_FINGERPRINT_SQL)
+    except Exception as e:
+        print(f"Error fingerprinting the database, skipping the result cache: {e}")
+        return None
+
+
+def connection_config():
+    return {
+        'db_uri': session['db_uri'],
+        'api_key': session['api_key'],
+        'mysql_host': session.get('mysql_host'),
+        'mysql_user': session.get('mysql_user'),
+        'mysql_password': session.get('mysql_password'),
+        'mysql_db': session.get('mysql_db'),
+    }
+
+
 # Route for the main page
 @app.route('/', methods=['GET', 'POST'])
 def index():
@@ -45,72 +208,89 @@ def chat():
     if 'db_uri' not in session or 'api_key' not in session:
         return redirect(url_for('index'))
 
-    db_uri = session['db_uri']
-    api_key = session['api_key']
-    mysql_host = session.get('mysql_host')
-    mysql_user = session.get('mysql_user')
-    mysql_password = session.get('mysql_password')
-    mysql_db = session.get('mysql_db')
+    # Plain GETs only render the page; the agent is built on the first question
+    if request.method != 'POST':
+        return render_template('chat.html')
 
-    # Initialize the LLM model
-    try:
-        llm = ChatGroq(groq_api_key=api_key, model_name="Llama3-8b-8192", streaming=True)
-        print("LLM initialized successfully")
-    except Exception as e:
-        return f"Error initializing LLM: {e}"
+    user_query = request.form.get('user_query')
+    if not user_query:
+        return "Please enter a query to ask the database."
 
-    # Database configuration
-    try:
-        def configure_db(db_uri, mysql_host=None, mysql_user=None, mysql_password=None, mysql_db=None):
-            if db_uri == "USE_LOCALDB":
-                dbfilepath = (Path(__file__).parent / "student.db").absolute()
-                creator = lambda: sqlite3.connect(f"file:{dbfilepath}?mode=ro", uri=True)
-                return SQLDatabase(create_engine("sqlite:///", creator=creator))
-            elif db_uri == "USE_MYSQL":
-                if not (mysql_host and mysql_user and mysql_password and mysql_db):
-                    return None
-                return SQLDatabase(create_engine(f"mysql+mysqlconnector://{mysql_user}:{mysql_password}@{mysql_host}/{mysql_db}"))
-
-        db = configure_db(db_uri, mysql_host, mysql_user, mysql_password, mysql_db)
-        if not db:
-            return "Database connection failed. Please check your database credentials."
-        
-        print("Database configured successfully")
-    except Exception as e:
-        return f"Error configuring the database: {e}"
+    config = connection_config()
+    if config['db_uri'] == "USE_MYSQL" and not all(config[k] for k in ('mysql_host', 'mysql_user', 'mysql_password', 'mysql_db')):
+        return "Database connection failed. Please check your database credentials."
 
-    # Initialize the SQLDatabaseToolkit
     try:
-        toolkit = SQLDatabaseToolkit(db=db, llm=llm)
-        agent = create_sql_agent(
-            llm=llm,
-            toolkit=toolkit,
-            verbose=True,
-            agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION
-        )
-        print("Agent initialized successfully")
+        resources = agents.get(config)
     except Exception as e:
         return f"Error initializing agent: {e}"
 
-    # Handle user input from the form
-    if request.method == 'POST':
-        user_query = request.form.get('user_query')
-        if not user_query:
-            return "Please enter a query to ask the database."
-        
-        print(f"User query: {user_query}")
+    print(f"User query: {user_query}")
+
+    start = time.perf_counter()
+    database = database_id(config)
+    fingerprint = database_fingerprint(config, resources)
+    cached = result_cache.get(database, fingerprint, user_query) if fingerprint else None
+    if cached is not None:
+        elapsed = time.perf_counter() - start
+        path_stats.record("cache", elapsed, 0)
+        return render_template('chat.html', query=user_query, response=cached['response'], sql=cached['sql'],
+                               columns=cached['columns'], rows=cached['rows'], path=f"cached {cached['path']}",
+                               elapsed=round(elapsed, 2), llm_calls=0)
+
+    counter = LLMCallCounter()
+    digest_text = relevant_digest(user_query, resources)
+    sql = columns = rows = None
+    path = "agent"
+    if SQL_FAST_PATH and digest_text is not None:
+        # One LLM call for the SQL, validated and run locally; the agent is the fallback
+        try:
+            sql, columns, rows = answer_fast(resources.llm, resources.db._engine, digest_text, user_query,
+                                             callbacks=[counter])
+            response = format_answer(columns, rows)
+            path = "fast"
+            print(f"Fast path SQL: {sql}")
+        except Exception as e:
+            print(f"Fast path failed, falling back to the agent: {e}")
+            path_stats.record_fast_failure(e)
+            path = "fallback"
 
+    if path != "fast":
         try:
             # Execute the query with the agent
-            response = agent.run(user_query)
+            response = resources.agent.run(agent_input(user_query, digest_text), callbacks=[counter])
             print(f"Agent response: {response}")
-            # Pass the response to the template
-            return render_template('chat.html', query=user_query, response=response)
         except Exception as e:
             return f"Error running the agent: {e}"
 
-    return render_template('chat.html')
+    if fingerprint:
+        result_cache.put(database, fingerprint, user_query,
+                         {"response": response, "sql": sql, "columns": columns, "rows": rows, "path": path})
+    elapsed = time.perf_counter() - start
+    path_stats.record(path, elapsed, counter.calls)
+    # Pass the response to the template
+    return render_template('chat.html', query=user_query, response=response, sql=sql, columns=columns, rows=rows,
+                           path=path, elapsed=round(elapsed, 2), llm_calls=counter.calls)
+
+
+@app.route('/stats')
+def stats():
+    return jsonify({"agents": agents.stats(), "answers": path_stats.snapshot(), "results": result_cache.stats()})
+
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(result_cache.stats())
+
 
+@app.route('/cache/clear', methods=['POST'])
+def cache_clear():
+    # ?scope=session only drops results for the database of the current session
+    if request.args.get('scope') == 'session' and 'db_uri' in session and 'api_key' in session:
+        result_cache.clear(database_id(connection_config()))
+    else:
+        result_cache.clear()
+    return jsonify(result_cache.stats())
 
 
 # Run the app
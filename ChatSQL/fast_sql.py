@@ -0,0 +1,131 @@
+import re
+import threading
+
+from langchain_core.callbacks import BaseCallbackHandler
+from sqlalchemy import text
+
+FAST_SQL_PROMPT = """You translate questions into a single {dialect} SQL query.
+Use only the tables and columns in this schema digest:
+{digest}
+
+Rules:
+- Return one read-only SELECT statement (a WITH ... SELECT is fine) and nothing else: no explanation, no markdown.
+- Only select the columns needed to answer the question.
+- Unless the question asks for a specific number of rows, add LIMIT {top_k}.
+- Use the sample values to match the exact spelling and case of stored values.
+
+Question: {question}
+SQL:"""
+
+FORBIDDEN = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|DROP|ALTER|CREATE|REPLACE|TRUNCATE|GRANT|REVOKE|ATTACH|DETACH|PRAGMA|VACUUM|CALL|LOAD|INTO\s+OUTFILE)\b",
+    re.IGNORECASE,
+)
+
+
+class UnsafeQuery(ValueError):
+    pass
+
+
+def extract_sql(reply):
+    """Pull the SQL out of an LLM reply that may be fenced or have a leading label."""
+    fenced = re.search(r"```(?:sql)?\s*(.*?)```", reply, re.DOTALL | re.IGNORECASE)
+    sql = fenced.group(1) if fenced else reply
+    sql = re.sub(r"^\s*SQL(?:Query)?\s*:\s*", "", sql, flags=re.IGNORECASE).strip()
+    return sql.rstrip(";").strip()
+
+
+def validate_sql(engine, sql):
+    """Local parse check and dry run; raises instead of touching any data.
+
+    The statement must be a single SELECT/WITH without write keywords, and
+    the database must be able to plan it (EXPLAIN), which catches syntax
+    errors and unknown tables or columns without running the query.
+    """
+    # Check the statement with string literals blanked out, so 'Drop-in' etc. do not trip it
+    bare = re.sub(r"'(?:[^']|'')*'", "''", sql or "")
+    if not bare or ";" in bare:
+        raise UnsafeQuery("expected exactly one SQL statement")
+    if not re.match(r"^\s*(SELECT|WITH)\b", bare, re.IGNORECASE):
+        raise UnsafeQuery("only SELECT queries are allowed")
+    if FORBIDDEN.search(bare):
+        raise UnsafeQuery("query contains a write or admin keyword")
+    explain = "EXPLAIN QUERY PLAN" if engine.dialect.name == "sqlite" else "EXPLAIN"
+    with engine.connect() as conn:
+        conn.execute(text(f"{explain} {sql}")).fetchall()
+
+
+def run_sql(engine, sql, max_rows=200):
+    with engine.connect() as conn:
+        result = conn.execute(text(sql))
+        columns = list(result.keys())
+        rows = [list(row) for row in result.fetchmany(max_rows)]
+    return columns, rows
+
+
+def format_answer(columns, rows):
+    if not rows:
+        return "The query returned no rows."
+    if len(rows) == 1 and len(columns) == 1:
+        return str(rows[0][0])
+    return f"{len(rows)} row{'s' if len(rows) != 1 else ''} returned."
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    """Counts LLM round trips made while answering one question."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def on_llm_end(self, response, **kwargs):
+        self.calls += 1
+
+
+def answer_fast(llm, engine, digest_text, question, top_k=10, max_rows=200, callbacks=None):
+    """One LLM call for the SQL, then local validation and execution.
+
+    Returns (sql, columns, rows); raises on an unusable reply, a query that
+    fails validation, or an execution error, so the caller can fall back to
+    the agent.
+    """
+    prompt = FAST_SQL_PROMPT.format(dialect=engine.dialect.name, digest=digest_text, top_k=top_k, question=question)
+    sql = extract_sql(llm.invoke(prompt, config={"callbacks": callbacks or []}).content)
+    validate_sql(engine, sql)
+    columns, rows = run_sql(engine, sql, max_rows)
+    return sql, columns, rows
+
+
+class PathStats:
+    """Per-path counters ("fast", "fallback", "agent") of latency and LLM round trips."""
+
+    def __init__(self):
+        self.paths = {}
+        self.fast_failures = {}
+        self._lock = threading.Lock()
+
+    def record(self, path, seconds, llm_calls):
+        with self._lock:
+            stats = self.paths.setdefault(path, {"questions": 0, "seconds": 0.0, "llm_calls": 0})
+            stats["questions"] += 1
+            stats["seconds"] += seconds
+            stats["llm_calls"] += llm_calls
+
+    def record_fast_failure(self, error):
+        with self._lock:
+            name = type(error).__name__
+            self.fast_failures[name] = self.fast_failures.get(name, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "paths": {
+                    path: {
+                        "questions": s["questions"],
+                        "mean_latency_s": round(s["seconds"] / s["questions"], 3),
+                        "mean_llm_calls": round(s["llm_calls"] / s["questions"], 2),
+                    }
+                    for path, s in self.paths.items()
+                },
+                "fast_failures": dict(self.fast_failures),
+            }
+
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import text
+
+# Columns of every table, in order: changes whenever the schema does
+DEFAULT_MYSQL_FINGERPRINT_SQL = (
+    "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE FROM information_schema.COLUMNS "
+    "WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME, ORDINAL_POSITION"
+)
+
+
+def normalize_question(question):
+    """Case, whitespace and trailing punctuation do not change what is being asked."""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.strip("\"'").rstrip("?.! ").strip()
+
+
+def sqlite_fingerprint(path):
+    """mtime and size of the database file (and its WAL, if any)."""
+    parts = []
+    for name in (path, f"{path}-wal"):
+        if os.path.exists(name):
+            st = os.stat(name)
+            parts.append(f"{st.st_mtime_ns}:{st.st_size}")
+    return "/".join(parts)
+
+
+def query_fingerprint(engine, sql=DEFAULT_MYSQL_FINGERPRINT_SQL):
+    """sha256 of the rows returned by `sql`, e.g. a schema listing or table update times."""
+    digest = hashlib.sha256()
+    with engine.connect() as conn:
+        for row in conn.execute(text(sql)):
+            digest.update(repr(tuple(row)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Cache of (database, fingerprint, normalized question) -> answer, SQL and rows.
+
+    The fingerprint identifies the current version of the database, so a
+    change to it makes older entries unreachable; they are dropped on the
+    next lookup for that database. Entries also expire after `ttl_seconds`.
+    The least recently used entries are evicted once there are more than
+    `max_entries` or their estimated size passes `max_bytes`. Results bigger
+    than a tenth of `max_bytes` are not cached. Safe to share between request
+    threads.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=32 * 2**20, ttl_seconds=600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()  # (database, fingerprint, question) -> (value, size, expires_at)
+        self._fingerprints = {}  # database -> latest fingerprint seen
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _purge_expired(self, now):
+        expired = [k for k, (_, _, expires_at) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            self._drop(key)
+        self.expirations += len(expired)
+
+    def _invalidate(self, database):
+        stale = [k for k in self._entries if k[0] == database]
+        for key in stale:
+            self._drop(key)
+        self.invalidations += len(stale)
+
+    def get(self, database, fingerprint, question):
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            if self._fingerprints.get(database, fingerprint) != fingerprint:
+                self._invalidate(database)
+            self._fingerprints[database] = fingerprint
+            key = (database, fingerprint, normalize_question(question))
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self, database, fingerprint, question, value):
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes // 10:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._purge_expired(now)
+            key = (database, fingerprint, normalize_question(question))
+            if key in self._entries:
+                self._drop(key)
+            while self._entries and (len(self._entries) >= self.max_entries or self._bytes + size > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+            self._entries[key] = (value, size, now + self.ttl_seconds)
+            self._bytes += size
+
+    def clear(self, database=None):
+        with self._lock:
+            if database is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._fingerprints.clear()
+                self._bytes = 0
+            else:
+                self._invalidate(database)
+                self._fingerprints.pop(database, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_mb": round(self._bytes / 2**20, 3),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "max_entries": self.max_entries,
+                "max_mb": round(self.max_bytes / 2**20, 2),
+                "ttl_seconds": self.ttl_seconds,
+            }
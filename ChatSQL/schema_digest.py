@@ -0,0 +1,121 @@
+import re
+
+from sqlalchemy import inspect, text
+
+STOP_WORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "and", "or", "with", "by", "is", "are", "was", "were",
+    "what", "which", "who", "how", "many", "much", "show", "list", "give", "me", "all", "each", "every",
+    "find", "get", "tell", "their", "there", "that", "this", "than", "do", "does", "from", "have", "has",
+}
+
+
+def _stem(word):
+    for suffix in ("ies", "es", "s"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[:-len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+
+def tokens(name):
+    """Lower-case word stems of an identifier or a question ("studentMarks" -> {"student", "mark"})."""
+    name = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", name)
+    return {_stem(w) for w in re.findall(r"[a-z0-9]+", name.lower()) if w not in STOP_WORDS}
+
+
+class SchemaDigest:
+    """Compact, precomputed description of a database for the SQL prompts.
+
+    Built once per cached database entry: tables, columns with types, primary
+    and foreign keys, row counts and a few distinct sample values per text
+    column. `relevant_tables` ranks tables against a question with a local
+    keyword match, so the agent only sees the part of the schema it needs.
+    """
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    @classmethod
+    def build(cls, engine, sample_values=5, sample_scan_rows=1000):
+        inspector = inspect(engine)
+        quote = engine.dialect.identifier_preparer.quote
+        tables = {}
+        with engine.connect() as conn:
+            for name in inspector.get_table_names():
+                columns = []
+                for column in inspector.get_columns(name):
+                    info = {"name": column["name"], "type": str(column["type"]), "samples": []}
+                    if info["type"].upper().startswith(("VARCHAR", "CHAR", "TEXT", "NVARCHAR", "ENUM")):
+                        # Only look at the first rows so wide tables stay cheap to digest
+                        rows = conn.execute(text(
+                            f"SELECT DISTINCT {quote(column['name'])} FROM "
+                            f"(SELECT {quote(column['name'])} FROM {quote(name)} LIMIT {sample_scan_rows}) AS s "
+                            f"WHERE {quote(column['name'])} IS NOT NULL LIMIT {sample_values}"
+                        ))
+                        info["samples"] = [str(row[0])[:40] for row in rows]
+                    columns.append(info)
+                tables[name] = {
+                    "columns": columns,
+                    "primary_key": inspector.get_pk_constraint(name).get("constrained_columns") or [],
+                    "foreign_keys": [
+                        {"columns": fk["constrained_columns"], "table": fk["referred_table"], "referred": fk["referred_columns"]}
+                        for fk in inspector.get_foreign_keys(name)
+                    ],
+                    "rows": cls._row_count(conn, engine, name, quote),
+                }
+        return cls(tables)
+
+    @staticmethod
+    def _row_count(conn, engine, name, quote):
+        if engine.dialect.name == "mysql":
+            # COUNT(*) scans InnoDB tables; the statistics estimate is good enough for a prompt
+            row = conn.execute(text(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :name"
+            ), {"name": name}).fetchone()
+            return int(row[0] or 0) if row else 0
+        return conn.execute(text(f"SELECT COUNT(*) FROM {quote(name)}")).scalar()
+
+    def _score(self, name, question_tokens, question_text):
+        table = self.tables[name]
+        score = 3 * len(tokens(name) & question_tokens)
+        for column in table["columns"]:
+            score += 2 * len(tokens(column["name"]) & question_tokens)
+            score += 2 * sum(1 for value in column["samples"] if len(value) > 2 and value.lower() in question_text)
+        return score
+
+    def relevant_tables(self, question, max_tables=5):
+        """Up to `max_tables` best-matching tables for `question`, plus every table they reference.
+
+        Referenced tables are always added, on top of `max_tables`, so joins
+        can be written from the digest alone. Returns every table when the
+        database has no more than `max_tables`, and an empty list when nothing
+        matches (the agent then explores the schema itself).
+        """
+        if len(self.tables) <= max_tables:
+            return list(self.tables)
+        question_tokens = tokens(question)
+        question_text = question.lower()
+        scored = sorted(((self._score(name, question_tokens, question_text), name) for name in self.tables), reverse=True)
+        selected = [name for score, name in scored if score > 0][:max_tables]
+        for name in list(selected):
+            for fk in self.tables[name]["foreign_keys"]:
+                if fk["table"] not in selected and fk["table"] in self.tables:
+                    selected.append(fk["table"])
+        return selected
+
+    def describe(self, names):
+        lines = []
+        for name in names:
+            table = self.tables[name]
+            columns = []
+            for column in table["columns"]:
+                entry = f"{column['name']} {column['type']}"
+                if column["samples"]:
+                    entry += " e.g. " + ", ".join(repr(v) for v in column["samples"])
+                columns.append(entry)
+            line = f"{name} ({table['rows']} rows): " + "; ".join(columns)
+            if table["primary_key"]:
+                line += f" | PK {', '.join(table['primary_key'])}"
+            for fk in table["foreign_keys"]:
+                line += f" | FK {', '.join(fk['columns'])} -> {fk['table']}({', '.join(fk['referred'])})"
+            lines.append(line)
+        return "\n".join(lines)
@@ -1,41 +1,170 @@
+import os
+import time
+import uuid
+import threading
 import requests
 import json
-from flask import Flask, render_template, request
+from flask import Flask, render_template, request, Response, stream_with_context, jsonify, session, redirect
+
+from conversations import ConversationStore
+from ollama_client import OllamaPool, QueueFull, QueueTimeout
 
 app = Flask(__name__)
+app.secret_key = os.getenv("FLASK_SECRET_KEY") or os.urandom(24)
+
+# One shared, pooled client; OLLAMA_URL may list several backends separated by commas
+ollama = OllamaPool(
+    os.getenv("OLLAMA_URL", "http://localhost:11434").split(","),
+    max_concurrency=int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2")),
+    max_queue=int(os.getenv("OLLAMA_MAX_QUEUE", "64")),
+    queue_timeout=float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "60")),
+    read_timeout=float(os.getenv("OLLAMA_READ_TIMEOUT", "300")),
+    fair=os.getenv("OLLAMA_FAIR_QUEUE", "1") == "1",
+)
 
-url = "http://localhost:11434/api/generate"
-headers = {'Content-Type': 'application/json'}
-history = []
+# Per-session chat history sent to /api/chat. It is only truncated once it
+# passes the token budget, so Ollama can reuse the cached prompt prefix.
+conversations = ConversationStore(
+    max_history_tokens=int(os.getenv("HISTORY_TOKEN_BUDGET", "2048")),
+    max_sessions=int(os.getenv("MAX_SESSIONS", "1000")),
+    session_ttl=int(os.getenv("SESSION_TTL_SECONDS", "3600")),
+)
 
-def generate_response(prompt):
-    history.append(prompt)
-    final_prompt = "\n".join(history)
+# Time-to-first-token / total-time samples for streamed generations
+metrics_lock = threading.Lock()
+stream_metrics = []
 
+def get_session_id():
+    if "sid" not in session:
+        session["sid"] = uuid.uuid4().hex
+    return session["sid"]
+
+def generate_response(session_id, prompt):
     data = {
         "model": "coder",
-        "prompt": final_prompt,
+        "messages": conversations.messages(session_id, prompt),
         "stream": False
     }
 
-    response = requests.post(url, headers=headers, data=json.dumps(data))
-
-    if response.status_code == 200:
-        data = json.loads(response.text)
-        actual_response = data['response']
-        return actual_response
-    else:
-        print("Error:", response.text)
+    try:
+        with ollama.post("/api/chat", data, user=session_id) as response:
+            if response.status_code == 200:
+                data = json.loads(response.text)
+                actual_response = data['message']['content']
+                conversations.append(session_id, prompt, actual_response)
+                return actual_response
+            else:
+                print("Error:", response.text)
+                return "Error generating response."
+    except (QueueFull, QueueTimeout):
+        return "The server is busy, please try again in a moment."
+    except requests.RequestException as e:
+        print("Error:", e)
         return "Error generating response."
 
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def record_stream_metrics(sample):
+    with metrics_lock:
+        stream_metrics.append(sample)
+        del stream_metrics[:-500]
+
+def stream_response(session_id, prompt):
+    """Relay Ollama's NDJSON token stream as Server-Sent Events."""
+    data = {
+        "model": "coder",
+        "messages": conversations.messages(session_id, prompt),
+        "stream": True
+    }
+
+    start = time.perf_counter()
+    first_token_s = None
+    tokens = 0
+    answer = []
+    final = {}
+    try:
+        with ollama.post("/api/chat", data, user=session_id, stream=True) as response:
+            if response.status_code != 200:
+                print("Error:", response.text)
+                yield sse("error", "Error generating response.")
+                return
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    yield sse("error", chunk["error"])
+                    return
+                token = chunk.get("message", {}).get("content")
+                if token:
+                    if first_token_s is None:
+                        first_token_s = time.perf_counter() - start
+                    tokens += 1
+                    answer.append(token)
+                    yield sse("token", token)
+                if chunk.get("done"):
+                    final = chunk
+                    break
+    except (QueueFull, QueueTimeout):
+        yield sse("error", "The server is busy, please try again in a moment.")
+        return
+    except requests.RequestException as e:
+        yield sse("error", str(e))
+        return
+
+    conversations.append(session_id, prompt, "".join(answer))
+    total_s = time.perf_counter() - start
+    sample = {
+        "ttft_s": round(first_token_s, 4) if first_token_s is not None else None,
+        "total_s": round(total_s, 4),
+        "tokens": tokens,
+        "tokens_per_s": round(tokens / total_s, 2) if total_s else 0.0,
+        # Prompt tokens Ollama actually evaluated; a cached prefix is not counted
+        "prompt_eval_count": final.get("prompt_eval_count"),
+    }
+    record_stream_metrics(sample)
+    yield sse("done", sample)
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
         user_prompt = request.form['prompt']
-        response = generate_response(user_prompt)
+        response = generate_response(get_session_id(), user_prompt)
         return render_template('index.html', response=response, prompt=user_prompt)
 
     return render_template('index.html', response='', prompt='')
 
+@app.route('/stream', methods=['POST'])
+def stream():
+    user_prompt = request.form.get('prompt') or (request.get_json(silent=True) or {}).get('prompt')
+    if not user_prompt:
+        return jsonify({"error": "prompt is required"}), 400
+    return Response(stream_with_context(stream_response(get_session_id(), user_prompt)), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/reset', methods=['POST'])
+def reset():
+    conversations.clear(get_session_id())
+    return redirect('/')
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    with metrics_lock:
+        samples = list(stream_metrics)
+    ttft = sorted(s["ttft_s"] for s in samples if s["ttft_s"] is not None)
+    prompt_eval = [s["prompt_eval_count"] for s in samples if s.get("prompt_eval_count") is not None]
+    pick = lambda values, q: values[min(len(values) - 1, int(q * len(values)))] if values else None
+    return jsonify({
+        "streams": len(samples),
+        "ttft_p50_s": pick(ttft, 0.5),
+        "ttft_p95_s": pick(ttft, 0.95),
+        "mean_total_s": round(sum(s["total_s"] for s in samples) / len(samples), 4) if samples else None,
+        "mean_prompt_eval_count": round(sum(prompt_eval) / len(prompt_eval), 1) if prompt_eval else None,
+        "conversations": conversations.stats(),
+        "ollama": ollama.stats(),
+        "recent": samples[-20:],
+    })
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,88 @@
+"""Load test for the pooled Ollama client, against stub_ollama.py servers.
+
+One "heavy" user fires a burst of requests while several light users send
+one request at a time. Each mode reports time to first token per user class
+and the mean queue wait:
+
+  unpooled  bare requests.post per call, no limit (the old behaviour)
+  fifo      OllamaPool with a plain FIFO queue
+  fair      OllamaPool with a round-robin-per-user queue
+
+    python stub_ollama.py --port 11435 --parallel 2 &
+    python stub_ollama.py --port 11436 --parallel 2 &
+    python benchmark_ollama_pool.py --urls http://127.0.0.1:11435 http://127.0.0.1:11436
+"""
+import argparse
+import json
+import threading
+import time
+
+import numpy as np
+import requests
+
+from ollama_client import OllamaPool
+
+
+def read_stream(response, start):
+    """Read the whole NDJSON stream; return the time to the first token."""
+    ttft = None
+    for line in response.iter_lines():
+        if ttft is None and line and json.loads(line).get("message", {}).get("content"):
+            ttft = time.perf_counter() - start
+    return ttft
+
+
+def run_mode(mode, urls, light_users, heavy_burst, light_requests, concurrency):
+    pool = None if mode == "unpooled" else OllamaPool(urls, max_concurrency=concurrency, fair=mode == "fair")
+    results = {"heavy": [], "light": []}
+    lock = threading.Lock()
+
+    def call(user, i):
+        payload = {"model": "coder", "messages": [{"role": "user", "content": f"{user} request {i}"}], "stream": True}
+        start = time.perf_counter()
+        if pool is None:
+            with requests.post(f"{urls[i % len(urls)]}/api/chat", json=payload, stream=True) as response:
+                ttft = read_stream(response, start)
+        else:
+            with pool.post("/api/chat", payload, user=user, stream=True) as response:
+                ttft = read_stream(response, start)
+        with lock:
+            results["heavy" if user == "heavy" else "light"].append(ttft)
+
+    def light(user):
+        time.sleep(0.05)  # arrive just after the burst
+        for i in range(light_requests):
+            call(user, i)
+
+    threads = [threading.Thread(target=call, args=("heavy", i)) for i in range(heavy_burst)]
+    threads += [threading.Thread(target=light, args=(f"user{u}",)) for u in range(light_users)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    return wall, results, pool.stats() if pool else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--urls", nargs="+", default=["http://127.0.0.1:11435"])
+    parser.add_argument("--light-users", type=int, default=4)
+    parser.add_argument("--light-requests", type=int, default=3, help="sequential requests per light user")
+    parser.add_argument("--heavy-burst", type=int, default=16, help="concurrent requests from the heavy user")
+    parser.add_argument("--concurrency", type=int, default=2, help="pool slots per backend")
+    args = parser.parse_args()
+
+    print(f"{'mode':<9} {'wall_s':>7} {'light_p50':>9} {'light_p95':>9} {'heavy_p50':>9} {'heavy_p95':>9} {'mean_wait':>9}")
+    for mode in ("unpooled", "fifo", "fair"):
+        wall, results, stats = run_mode(mode, args.urls, args.light_users, args.heavy_burst,
+                                        args.light_requests, args.concurrency)
+        light = np.percentile(results["light"], [50, 95])
+        heavy = np.percentile(results["heavy"], [50, 95])
+        wait = f"{stats['mean_wait_s']:>9.3f}" if stats else f"{'-':>9}"
+        print(f"{mode:<9} {wall:>7.2f} {light[0]:>9.3f} {light[1]:>9.3f} {heavy[0]:>9.3f} {heavy[1]:>9.3f} {wait}")
+
+
+if __name__ == "__main__":
+    main()
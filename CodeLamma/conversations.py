@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_tokens(text):
+    # Code averages a little under 4 characters per Llama token; close enough for budgeting
+    return max(1, len(text) // 4) if text else 0
+
+
+def messages_tokens(messages):
+    return sum(estimate_tokens(m["content"]) + 4 for m in messages)
+
+
+class _Conversation:
+    def __init__(self):
+        self.messages = []
+        self.truncations = 0
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class ConversationStore:
+    """Per-session message history for Ollama's /api/chat, capped at a token budget.
+
+    Ollama keeps the KV cache of the previous prompt and only processes what
+    comes after the longest shared prefix, so the history is sent unchanged
+    from turn to turn. Once it grows past `max_history_tokens`, the oldest
+    turns are dropped in one go until it fits in `truncate_to` of the budget.
+    The prefix therefore changes once every few turns rather than on every
+    turn, and the prompt never grows past the budget. Idle sessions expire
+    after `session_ttl` seconds and at most `max_sessions` are kept.
+    """
+
+    def __init__(self, max_history_tokens=2048, truncate_to=0.5, max_sessions=1000, session_ttl=3600):
+        self.max_history_tokens = max_history_tokens
+        self.truncate_to = truncate_to
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _conversation(self, session_id):
+        with self._lock:
+            now = time.monotonic()
+            while self._sessions:
+                oldest_id, oldest = next(iter(self._sessions.items()))
+                if len(self._sessions) < self.max_sessions and now - oldest.last_used < self.session_ttl:
+                    break
+                del self._sessions[oldest_id]
+            conversation = self._sessions.pop(session_id, None) or _Conversation()
+            conversation.last_used = now
+            self._sessions[session_id] = conversation
+            return conversation
+
+    def messages(self, session_id, prompt):
+        """Messages to send for a new user prompt: the kept history plus the prompt."""
+        conversation = self._conversation(session_id)
+        with conversation.lock:
+            return list(conversation.messages) + [{"role": "user", "content": prompt}]
+
+    def turns(self, session_id):
+        conversation = self._conversation(session_id)
+        with conversation.lock:
+            return list(conversation.messages)
+
+    def append(self, session_id, prompt, answer):
+        conversation = self._conversation(session_id)
+        with conversation.lock:
+            conversation.messages.extend([
+                {"role": "user", "content": prompt},
+                {"role": "assistant", "content": answer},
+            ])
+            if messages_tokens(conversation.messages) <= self.max_history_tokens:
+                return
+            target = int(self.max_history_tokens * self.truncate_to)
+            # Always keep the latest exchange, even if it alone exceeds the budget
+            while len(conversation.messages) > 2 and messages_tokens(conversation.messages) > target:
+                del conversation.messages[:2]
+            conversation.truncations += 1
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            conversations = list(self._sessions.values())
+        history_tokens = [messages_tokens(c.messages) for c in conversations]
+        return {
+            "sessions": len(conversations),
+            "max_history_tokens": self.max_history_tokens,
+            "mean_history_tokens": round(sum(history_tokens) / len(history_tokens), 1) if history_tokens else 0,
+            "truncations": sum(c.truncations for c in conversations),
+        }
@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class QueueFull(Exception):
+    pass
+
+
+class QueueTimeout(Exception):
+    pass
+
+
+class _Backend:
+    def __init__(self, base_url, max_concurrency):
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.served = 0
+        self.errors = 0
+        # Keep-alive connections, one per generation slot
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+
+class _Waiter:
+    def __init__(self, user):
+        self.user = user
+        self.backend = None
+        self.event = threading.Event()
+
+
+class OllamaPool:
+    """Shared client for one or more Ollama backends.
+
+    Each backend runs at most `max_concurrency` generations at once over a
+    pooled keep-alive session. Requests beyond that wait in a queue of at
+    most `max_queue` entries. With `fair=True` the queue is round-robin over
+    users, so one user sending a burst only delays their own requests;
+    otherwise it is plain FIFO. A freed slot goes to the next waiter, on the
+    backend with the fewest generations in flight.
+    """
+
+    def __init__(self, base_urls, max_concurrency=2, max_queue=64, queue_timeout=60.0,
+                 connect_timeout=5.0, read_timeout=300.0, fair=True):
+        self.backends = [_Backend(u, max_concurrency) for u in base_urls]
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.timeout = (connect_timeout, read_timeout)
+        self.fair = fair
+        self._queue = OrderedDict()  # user -> deque of waiters, in round-robin order
+        self._queued = 0
+        self._waits = deque(maxlen=1000)
+        self._rejected = 0
+        self._timed_out = 0
+        self._lock = threading.Lock()
+
+    def _free_backend(self):
+        free = [b for b in self.backends if b.in_flight < b.max_concurrency]
+        return min(free, key=lambda b: b.in_flight / b.max_concurrency) if free else None
+
+    def _dispatch(self):
+        # Called with self._lock held
+        while self._queue:
+            backend = self._free_backend()
+            if backend is None:
+                return
+            user, waiters = self._queue.popitem(last=False)
+            waiter = waiters.popleft()
+            if waiters:
+                self._queue[user] = waiters
+            self._queued -= 1
+            backend.in_flight += 1
+            waiter.backend = backend
+            waiter.event.set()
+
+    def _acquire(self, user):
+        key = user if self.fair else None
+        start = time.perf_counter()
+        waiter = _Waiter(key)
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._rejected += 1
+                raise QueueFull(f"{self._queued} requests already waiting for Ollama")
+            self._queue.setdefault(key, deque()).append(waiter)
+            self._queued += 1
+            self._dispatch()
+        if not waiter.event.wait(self.queue_timeout):
+            with self._lock:
+                if waiter.backend is None:
+                    waiters = self._queue.get(key)
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del self._queue[key]
+                    self._queued -= 1
+                    self._timed_out += 1
+                    raise QueueTimeout(f"no Ollama slot free after {self.queue_timeout}s")
+        with self._lock:
+            self._waits.append(time.perf_counter() - start)
+        return waiter.backend
+
+    def _release(self, backend, ok):
+        with self._lock:
+            backend.in_flight -= 1
+            backend.served += 1
+            if not ok:
+                backend.errors += 1
+            self._dispatch()
+
+    @contextmanager
+    def post(self, path, payload, user=None, stream=False):
+        """Wait for a slot, POST `payload` as JSON and yield the response.
+
+        The slot is held until the block exits, so a streamed response keeps
+        its slot until it has been read.
+        """
+        backend = self._acquire(user)
+        ok = False
+        try:
+            with backend.session.post(f"{backend.base_url}{path}", json=payload, stream=stream,
+                                      timeout=self.timeout) as response:
+                yield response
+            ok = response.status_code == 200
+        finally:
+            self._release(backend, ok)
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                "queue_depth": self._queued,
+                "queued_users": len(self._queue),
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "mean_wait_s": round(sum(waits) / len(waits), 4) if waits else 0.0,
+                "p95_wait_s": round(waits[min(len(waits) - 1, int(0.95 * len(waits)))], 4) if waits else 0.0,
+                "backends": [
+                    {"url": b.base_url, "in_flight": b.in_flight, "max_concurrency": b.max_concurrency,
+                     "served": b.served, "errors": b.errors}
+                    for b in self.backends
+                ],
+            }
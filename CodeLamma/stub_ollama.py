@@ -0,0 +1,118 @@
+"""Local stand-in for Ollama's /api/generate and /api/chat, for testing the app.
+
+Streams a canned code answer as NDJSON, one word per chunk. Like Ollama it
+keeps the previous prompt cached and only "evaluates" the part after the
+longest shared prefix: prompt processing costs `--prompt-token-ms` per
+uncached token, and prompt_eval_count reports just those tokens. It limits
+how many requests it serves at once to mimic a single model instance.
+
+    python stub_ollama.py --port 11435 --prefill-ms 100 --token-ms 20
+    OLLAMA_URL=http://localhost:11435 python appp.py
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = (
+    "Here is a function that reverses a string in Python:\n\n"
+    "```python\ndef reverse(text):\n    return text[::-1]\n```\n\n"
+    "Slicing with a step of -1 walks the string from the end to the start."
+)
+
+
+def answer_tokens(max_tokens):
+    words = ANSWER.replace("\n", " \n ").split(" ")
+    return [w if w == "\n" else w + " " for w in words if w][:max_tokens]
+
+
+def render_prompt(body):
+    if "messages" in body:
+        return "".join(f"[{m.get('role')}]{m.get('content', '')}" for m in body["messages"]) + "[assistant]"
+    return body.get("prompt", "")
+
+
+class OllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    prefill = 0.1
+    prompt_token_delay = 0.0005
+    token_delay = 0.02
+    max_tokens = 200
+    slots = threading.Semaphore(1)
+    cached_prompt = ""
+    served = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path not in ("/api/generate", "/api/chat"):
+            self.send_error(404)
+            return
+
+        chat = self.path == "/api/chat"
+        prompt = render_prompt(body)
+        stream = body.get("stream", True)
+        with OllamaHandler.slots:
+            shared = len(os.path.commonprefix([OllamaHandler.cached_prompt, prompt]))
+            prompt_eval_count = max(1, (len(prompt) - shared) // 4)
+            OllamaHandler.cached_prompt = prompt
+            time.sleep(self.prefill + self.prompt_token_delay * prompt_eval_count)
+            tokens = answer_tokens(self.max_tokens)
+            stats = {"done": True, "prompt_eval_count": prompt_eval_count, "eval_count": len(tokens)}
+            if stream:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for token in tokens:
+                    time.sleep(self.token_delay)
+                    self._chunk({"model": body.get("model"), **self._content(chat, token), "done": False})
+                self._chunk({"model": body.get("model"), **self._content(chat, ""), **stats})
+                self.wfile.write(b"0\r\n\r\n")
+            else:
+                time.sleep(self.token_delay * len(tokens))
+                data = json.dumps({"model": body.get("model"), **self._content(chat, "".join(tokens)), **stats}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            # The answer becomes part of the cached sequence, as in a real KV cache
+            OllamaHandler.cached_prompt = prompt + "".join(tokens)
+            OllamaHandler.served += 1
+
+    @staticmethod
+    def _content(chat, text):
+        return {"message": {"role": "assistant", "content": text}} if chat else {"response": text}
+
+    def _chunk(self, payload):
+        data = json.dumps(payload).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--prefill-ms", type=float, default=100, help="fixed time before the first token")
+    parser.add_argument("--prompt-token-ms", type=float, default=0.5, help="simulated time per uncached prompt token")
+    parser.add_argument("--token-ms", type=float, default=20, help="simulated time per generated token")
+    parser.add_argument("--max-tokens", type=int, default=200)
+    parser.add_argument("--parallel", type=int, default=1, help="requests processed at once")
+    args = parser.parse_args()
+
+    OllamaHandler.prefill = args.prefill_ms / 1000
+    OllamaHandler.prompt_token_delay = args.prompt_token_ms / 1000
+    OllamaHandler.token_delay = args.token_ms / 1000
+    OllamaHandler.max_tokens = args.max_tokens
+    OllamaHandler.slots = threading.Semaphore(args.parallel)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), OllamaHandler)
+    print(f"Stand-in Ollama server on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"Served {OllamaHandler.served} generations")
@@ -0,0 +1,139 @@
+"""Pluggable nearest-neighbour backends for dual-encoder answer retrieval.
+
+All backends score by inner product (the same score as the original
+`q_emb @ answer_embeddings.T`) and share one interface:
+
+    index.search(queries, k) -> (scores, indices)   # both shaped (n_queries, k)
+
+Backends:
+    exact - brute-force matmul + top-k in torch (reference for recall)
+    ivf   - faiss IndexIVFFlat, tuned with nlist / nprobe
+    hnsw  - faiss IndexHNSWFlat, tuned with M / ef_construction / ef_search
+
+faiss is only imported by the approximate backends.
+"""
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+import torch
+
+BACKENDS = ("exact", "ivf", "hnsw")
+
+
+class ExactIndex:
+    name = "exact"
+
+    def __init__(self, embeddings):
+        self.embeddings = torch.as_tensor(embeddings)
+
+    def __len__(self):
+        return self.embeddings.shape[0]
+
+    def search(self, queries, k):
+        q = torch.as_tensor(queries).to(device=self.embeddings.device, dtype=self.embeddings.dtype)
+        sims = torch.matmul(q, self.embeddings.T)
+        scores, indices = torch.topk(sims, k=min(k, len(self)), dim=1)
+        return scores.cpu().numpy(), indices.cpu().numpy()
+
+    def memory_bytes(self):
+        return self.embeddings.element_size() * self.embeddings.nelement()
+
+
+class FaissIndex:
+    def __init__(self, name, index):
+        self.name = name
+        self.index = index
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def search(self, queries, k):
+        queries = np.ascontiguousarray(np.asarray(queries, dtype="float32"))
+        return self.index.search(queries, k)
+
+    def memory_bytes(self):
+        # Vectors + ids/links + coarse centroids; an estimate, faiss does not report it
+        n, d = self.index.ntotal, self.index.d
+        if self.name == "ivf":
+            return n * (d * 4 + 8) + self.index.nlist * d * 4
+        return n * d * 4 + n * self.index.hnsw.nb_neighbors(0) * 4
+
+    def save(self, path):
+        import faiss
+        faiss.write_index(self.index, path)
+
+
+def _as_float32(embeddings):
+    if isinstance(embeddings, torch.Tensor):
+        embeddings = embeddings.detach().cpu().numpy()
+    return np.ascontiguousarray(embeddings, dtype="float32")
+
+
+def build_ivf(embeddings, nlist=None, nprobe=16, train_size=None, seed=42):
+    import faiss
+
+    x = _as_float32(embeddings)
+    n, d = x.shape
+    nlist = nlist or max(1, int(4 * math.sqrt(n)))
+    train_size = min(n, train_size or 64 * nlist)
+    train = x[np.random.default_rng(seed).choice(n, size=train_size, replace=False)]
+
+    quantizer = faiss.IndexFlatIP(d)
+    index = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_INNER_PRODUCT)
+    index.train(train)
+    index.add(x)
+    index.nprobe = nprobe
+    return FaissIndex("ivf", index)
+
+
+def build_hnsw(embeddings, M=32, ef_construction=200, ef_search=64):
+    import faiss
+
+    x = _as_float32(embeddings)
+    index = faiss.IndexHNSWFlat(x.shape[1], M, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = ef_construction
+    index.add(x)
+    index.hnsw.efSearch = ef_search
+    return FaissIndex("hnsw", index)
+
+
+def build_index(backend, embeddings, **params):
+    if backend == "exact":
+        return ExactIndex(embeddings)
+    if backend == "ivf":
+        return build_ivf(embeddings, **params)
+    if backend == "hnsw":
+        return build_hnsw(embeddings, **params)
+    raise ValueError(f"Unknown ANN backend {backend!r}; expected one of {BACKENDS}")
+
+
+def _apply_search_params(index, params):
+    if index.name == "ivf":
+        index.index.nprobe = params.get("nprobe", 16)
+    if index.name == "hnsw":
+        index.index.hnsw.efSearch = params.get("ef_search", 64)
+    return index
+
+
+def load_or_build_index(backend, embeddings, cache_dir, **params):
+    """Build the requested backend once and cache approximate indexes in
+    `cache_dir` (the artifact directory, so they follow the embeddings)."""
+    if backend == "exact":
+        return ExactIndex(embeddings)
+
+    import faiss
+
+    # Search-time knobs do not change the stored index, so leave them out of the file name
+    build_params = {k: v for k, v in params.items() if k not in ("nprobe", "ef_search")}
+    suffix = hashlib.sha256(json.dumps(build_params, sort_keys=True).encode("utf-8")).hexdigest()[:8]
+    path = os.path.join(cache_dir, f"answers-{backend}-{suffix}.faiss")
+    if os.path.exists(path):
+        return _apply_search_params(FaissIndex(backend, faiss.downcast_index(faiss.read_index(path))), params)
+
+    index = build_index(backend, embeddings, **params)
+    index.save(path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return index
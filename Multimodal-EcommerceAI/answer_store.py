@@ -0,0 +1,53 @@
+import os
+import random
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+
+class AnswerStore:
+    """Question/Answer pairs kept resident as a memory-mapped Arrow table.
+
+    The parquet file is converted once into an uncompressed Arrow IPC file
+    with a single record batch, so every column is one contiguous array and
+    fetching a row by position is O(1) without copying the table into the
+    Python heap.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self._questions = table.column("Question").chunk(0) if table.num_rows else pa.array([], pa.string())
+        self._answers = table.column("Answer").chunk(0) if table.num_rows else pa.array([], pa.string())
+
+    @classmethod
+    def open(cls, parquet_path, arrow_path=None):
+        arrow_path = arrow_path or os.path.splitext(parquet_path)[0] + ".arrow"
+        if not os.path.exists(arrow_path) or os.path.getmtime(arrow_path) < os.path.getmtime(parquet_path):
+            cls.convert(parquet_path, arrow_path)
+        source = pa.memory_map(arrow_path, "r")
+        return cls(ipc.open_file(source).read_all())
+
+    @staticmethod
+    def convert(parquet_path, arrow_path):
+        table = pq.read_table(parquet_path, columns=["Question", "Answer"]).combine_chunks()
+        tmp_path = arrow_path + ".tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table, max_chunksize=max(table.num_rows, 1))
+        os.replace(tmp_path, arrow_path)
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def question(self, idx):
+        return self._questions[idx].as_py()
+
+    def answer(self, idx):
+        return self._answers[idx].as_py()
+
+    def row(self, idx):
+        return {"Question": self.question(idx), "Answer": self.answer(idx)}
+
+    def sample_answer(self, seed=42):
+        return self.answer(random.Random(seed).randrange(len(self)))
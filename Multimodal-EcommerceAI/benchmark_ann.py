@@ -0,0 +1,108 @@
+"""Benchmark the answer-retrieval backends: recall@k, p50/p99 latency, memory.
+
+Vectors are synthetic 128-d clustered embeddings (same dimension as the
+dual encoder's projection) so that 1M and 10M rows can be tested without a
+catalogue that large. Pass --embeddings to use real answer embeddings too.
+Recall is measured against the exact backend on the same vectors.
+
+    python benchmark_ann.py --sizes 100000 1000000 10000000 --k 3
+    python benchmark_ann.py --embeddings artifacts/<key>/answer_embeddings.pt
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from ann_index import build_index
+
+
+def synthetic_embeddings(n, dim=128, clusters=1024, seed=0, chunk=1_000_000):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype("float32")
+    out = np.empty((n, dim), dtype="float32")
+    for start in range(0, n, chunk):
+        stop = min(n, start + chunk)
+        assign = rng.integers(0, clusters, size=stop - start)
+        out[start:stop] = centers[assign] + 0.5 * rng.standard_normal((stop - start, dim)).astype("float32")
+    return out
+
+
+def make_queries(x, n_queries, seed=1):
+    rng = np.random.default_rng(seed)
+    picks = x[rng.choice(len(x), size=n_queries, replace=False)]
+    return (picks + 0.3 * rng.standard_normal(picks.shape)).astype("float32")
+
+
+def time_queries(index, queries, k):
+    latencies = []
+    results = []
+    for q in queries:
+        start = time.perf_counter()
+        _, idx = index.search(q[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(idx[0])
+    return np.array(latencies), np.array(results)
+
+
+def recall_at_k(found, truth):
+    hits = [len(set(f.tolist()) & set(t.tolist())) for f, t in zip(found, truth)]
+    return float(np.mean(hits)) / truth.shape[1]
+
+
+def run(label, x, args):
+    queries = make_queries(x, args.queries)
+    print(f"\n== {label}: {len(x):,} vectors x {x.shape[1]} dims ==")
+    print(f"{'backend':<16} {'build_s':>8} {'recall@k':>9} {'p50_ms':>8} {'p99_ms':>8} {'index_mb':>9}")
+
+    configs = [("exact", {})]
+    configs += [("ivf", {"nprobe": nprobe}) for nprobe in args.nprobe]
+    configs += [("hnsw", {"M": args.hnsw_m, "ef_search": ef}) for ef in args.ef_search]
+
+    truth = None
+    built = {}
+    for backend, params in configs:
+        start = time.perf_counter()
+        if backend == "ivf" and "ivf" in built:
+            index = built["ivf"]
+            index.index.nprobe = params["nprobe"]
+            build_s = 0.0
+        elif backend == "hnsw" and "hnsw" in built:
+            index = built["hnsw"]
+            index.index.hnsw.efSearch = params["ef_search"]
+            build_s = 0.0
+        else:
+            index = build_index(backend, torch.from_numpy(x) if backend == "exact" else x, **params)
+            built[backend] = index
+            build_s = time.perf_counter() - start
+
+        latencies, found = time_queries(index, queries, args.k)
+        if truth is None:
+            truth = found
+        p50, p99 = np.percentile(latencies, [50, 99])
+        name = backend + "".join(f" {k}={v}" for k, v in params.items() if k != "M")
+        print(f"{name:<16} {build_s:>8.1f} {recall_at_k(found, truth):>9.3f} {p50:>8.2f} {p99:>8.2f} "
+              f"{index.memory_bytes() / 2**20:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--embeddings", help="answer_embeddings.pt to benchmark in addition to synthetic data")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[32, 128])
+    args = parser.parse_args()
+
+    torch.set_grad_enabled(False)
+    if args.embeddings:
+        real = torch.load(args.embeddings, map_location="cpu").numpy().astype("float32")
+        run(f"real ({args.embeddings})", real, args)
+    for n in args.sizes:
+        run("synthetic", synthetic_embeddings(n), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,38 +7,32 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 LANGCHAIN_API_KEY = os.getenv("LANGCHAIN_API_KEY")
 
 import torch
-from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
-from peft import PeftModel
-import pandas as pd
-
-trained_tokenizer = AutoTokenizer.from_pretrained("tokenizer_Generative_qa_model")
-base_model = AutoModelForSeq2SeqLM.from_pretrained("google/flan-t5-base").to("cuda")
-base_model.resize_token_embeddings(len(trained_tokenizer))
-trained_model = PeftModel.from_pretrained(base_model, "trainer_Generative_qa_model").to("cuda")
-
-def generate_answer(question, context, model, tokenizer):
-    input_text = f"question: {question} context: {context}"
-    input_ids = tokenizer.encode(input_text, return_tensors="pt").to("cuda")
-
-    outputs = model.generate(
-        input_ids=input_ids,
-        max_length=128,
-        min_length=20,
-        num_beams=5,
-        repetition_penalty=1.2,
-        length_penalty=1.0,
-        early_stopping=True
-    )
-
-    answer = tokenizer.decode(outputs[0], skip_special_tokens=True)
-    return answer.strip()
-
-def answer_natural_question(question, context=None, fallback_csv="single_qna.csv"):
+from t5_answerer import load_answerer, generate_answers
+from micro_batcher import MicroBatcher
+
+# Generation runs on GPU when available; on CPU-only nodes the LoRA adapter is merged
+# into flan-t5 and Linear layers are int8-quantized. QNA_GENERATION_PRESET picks
+# beam5 (original quality), beam2 or greedy.
+generation_device = os.getenv("QNA_GENERATION_DEVICE", "cuda" if torch.cuda.is_available() else "cpu")
+quantize_generation = os.getenv("QNA_QUANTIZE_INT8", "1" if generation_device == "cpu" else "0") == "1"
+generation_preset = os.getenv("QNA_GENERATION_PRESET", "beam5")
+trained_model, trained_tokenizer = load_answerer(generation_device, merge=True, quantize=quantize_generation)
+
+def generate_answer(question, context, model, tokenizer, preset=None):
+    return generate_answers([question], [context], model, tokenizer, preset or generation_preset)[0]
+
+# Concurrent requests are coalesced into one batched generate() call
+answer_batcher = MicroBatcher(
+    lambda items: generate_answers([q for q, _ in items], [c for _, c in items], trained_model, trained_tokenizer, generation_preset),
+    max_batch_size=int(os.getenv("QNA_GENERATION_MAX_BATCH", "8")),
+    max_wait_ms=float(os.getenv("QNA_GENERATION_MAX_WAIT_MS", "10")),
+)
+
+def answer_natural_question(question, context=None):
     if context is None:
-        df = pd.read_csv(fallback_csv)[['Question', 'Answer']].dropna().sample(1, random_state=42)
-        context = df.iloc[0]['Answer']
+        context = fallback_context
     
-    generated = generate_answer(question, context, trained_model, trained_tokenizer)
+    generated = answer_batcher.submit((question, context))
 
     return {
         "question": question,
@@ -46,68 +40,48 @@ def answer_natural_question(question, context=None, fallback_csv="single_qna.csv
         "generated_answer": generated
     }
 
-from transformers import AutoTokenizer, AutoModel
-import torch.nn as nn
-
-class DualEncoder(nn.Module):
-    def __init__(self, model_name, output_dim=128):
-        super().__init__()
-        self.base_model = AutoModel.from_pretrained(model_name)
-        self.projection = nn.Linear(self.base_model.config.hidden_size, output_dim)
-
-    def forward(self, input_ids, attention_mask):
-        output = self.base_model(input_ids=input_ids, attention_mask=attention_mask)
-        cls_token = output.last_hidden_state[:, 0]
-        return self.projection(cls_token)
+from transformers import AutoTokenizer
+from dual_encoder import MODEL_NAME, load_encoder, encode_texts
+from qna_artifacts import ARTIFACT_ROOT, load_artifacts
+from ann_index import load_or_build_index
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model_name = 'sentence-transformers/all-MiniLM-L6-v2'
+model_name = MODEL_NAME
 tokenizer = AutoTokenizer.from_pretrained(model_name)
 
-question_encoder = DualEncoder(model_name).to(device)
-answer_encoder = DualEncoder(model_name).to(device)
-question_encoder.load_state_dict(torch.load("q_encoder_finetuned.pth", map_location=device))
-answer_encoder.load_state_dict(torch.load("a_encoder_finetuned.pth", map_location=device))
-question_encoder.eval()
-answer_encoder.eval()
+question_encoder = load_encoder("q_encoder_finetuned.pth", device)
 
-df = pd.read_csv("single_qna.csv")[['Question', 'Answer']].dropna()
-df = df.sample(n=100000, random_state=42).reset_index(drop=True)
-df.to_parquet("qna_df.parquet", index=False)
+# Sampled answer store + answer embeddings are built ahead of time by
+# `python qna_artifacts.py`; loading fails loudly if they do not match these inputs
+answer_store, answer_embeddings, artifact_manifest = load_artifacts(
+    "single_qna.csv", "a_encoder_finetuned.pth", seed=42, sample_size=100000, device=device
+)
+print(f"✅ Loaded artifacts {artifact_manifest['key']} ({len(answer_store)} answers)")
+fallback_context = answer_store.sample_answer(seed=42)
 
 def get_embeddings(model, texts, batch_size=256):
-    all_embeddings = []
-    for i in range(0, len(texts), batch_size):
-        batch_texts = texts[i:i+batch_size]
-        tokens = tokenizer(batch_texts, padding=True, truncation=True, return_tensors='pt', max_length=64)
-        tokens.pop("token_type_ids", None)
-        tokens = {k: v.to(device) for k, v in tokens.items()}
-        with torch.no_grad():
-            emb = model(**tokens)
-        all_embeddings.append(emb.cpu())
-    return torch.cat(all_embeddings, dim=0)
-
-embedding_path = "answer_embeddings.pt"
-if not os.path.exists(embedding_path):
-    print("➡️ Generating and saving answer embeddings...")
-    answer_embeddings = get_embeddings(answer_encoder, df['Answer'].tolist())
-    torch.save(answer_embeddings, embedding_path)
-else:
-    print("✅ Loading precomputed embeddings...")
-    answer_embeddings = torch.load(embedding_path).to(device)
+    return encode_texts(model, tokenizer, texts, device, batch_size=batch_size)
+
+# Nearest-neighbour backend over the answer embeddings: "exact" (brute force), "ivf" or "hnsw".
+# Approximate indexes are built once and cached next to the artifacts they were built from.
+ann_backend = os.getenv("QNA_ANN_BACKEND", "exact")
+ann_index = load_or_build_index(
+    ann_backend, answer_embeddings, cache_dir=os.path.join(ARTIFACT_ROOT, artifact_manifest["key"])
+)
+print(f"✅ Answer retrieval backend: {ann_backend}")
 
 def get_top_k_answers_dual_encoder(question, top_k=3):
-    q_emb = get_embeddings(question_encoder, [question]).to(device)  # <== move to same device
-    sims = torch.matmul(q_emb, answer_embeddings.T).squeeze()
-    topk_scores, topk_indices = torch.topk(sims, k=top_k)
+    q_emb = get_embeddings(question_encoder, [question])
+    topk_scores, topk_indices = ann_index.search(q_emb.numpy(), top_k)
 
-    df = pd.read_parquet("qna_df.parquet")
     top_answers = []
-    for score, idx in zip(topk_scores.tolist(), topk_indices.tolist()):
+    for score, idx in zip(topk_scores[0].tolist(), topk_indices[0].tolist()):
+        if idx < 0:  # faiss pads with -1 when fewer than top_k neighbours are found
+            continue
         top_answers.append({
-            "answer": df.loc[idx, 'Answer'],
+            "answer": answer_store.answer(idx),
             "score": round(score, 4),
-            "reference_question": df.loc[idx, 'Question']
+            "reference_question": answer_store.question(idx)
         })
 
     return top_answers
@@ -131,6 +105,11 @@ def retrieve_dual_encoder(state: dict) -> dict:
     top_answers = get_top_k_answers_dual_encoder(improved_question, top_k=3)
     return {"dual_encoder_answers": top_answers}
 
+def generate_local_answer(state: dict) -> dict:
+    # Only needs the original question, so it runs alongside ImproveQuestion -> RetrieveDualEncoder
+    fine_tuned_result = answer_natural_question(state["question"], context="")
+    return {"fine_tuned_answer": fine_tuned_result.get('generated_answer', '')}
+
 def generate_final_answer(state: dict) -> dict:
     import re
 
@@ -153,8 +132,7 @@ def generate_final_answer(state: dict) -> dict:
     print("==[ DEBUG: Similar QA examples (hint only) ]==")
     print(examples_section)
 
-    fine_tuned_result = answer_natural_question(question, context="")
-    fine_tuned_answer = fine_tuned_result.get('generated_answer', '')
+    fine_tuned_answer = state.get("fine_tuned_answer", "")
 
     prompt = (
         "You are a knowledgeable and helpful assistant.\n\n"
@@ -180,29 +158,69 @@ def generate_final_answer(state: dict) -> dict:
 
     return {"final_answer": grok_answer}
 
-from typing import TypedDict, List, Dict, Any
-from langgraph.graph import StateGraph, END
+import operator
+import time
+from typing import Annotated, TypedDict, List, Dict, Any
+from langgraph.graph import StateGraph, START, END
 from langchain_core.runnables import RunnableLambda
 
 class QAState(TypedDict):
     question: str
     improved_question: str
     dual_encoder_answers: List[Dict[str, Any]]
+    fine_tuned_answer: str
     final_answer: str
+    # Parallel branches write here at the same time, so updates are merged
+    timings: Annotated[Dict[str, float], operator.or_]
+
+def timed(name, func):
+    def run(state: dict) -> dict:
+        start = time.perf_counter()
+        update = func(state)
+        return {**update, "timings": {name: round(time.perf_counter() - start, 4)}}
+    return run
+
+def improve_and_retrieve(state: dict) -> dict:
+    # One node, so this branch does not wait for LocalAnswer's superstep between the two steps
+    start = time.perf_counter()
+    improved = improve_question_func(state)
+    improved_at = time.perf_counter()
+    retrieved = retrieve_dual_encoder({**state, **improved})
+    return {**improved, **retrieved, "timings": {
+        "ImproveQuestion": round(improved_at - start, 4),
+        "RetrieveDualEncoder": round(time.perf_counter() - improved_at, 4),
+    }}
+
+def critical_path_seconds(timings: dict) -> float:
+    remote = timings.get("ImproveQuestion", 0.0) + timings.get("RetrieveDualEncoder", 0.0)
+    return max(remote, timings.get("LocalAnswer", 0.0)) + timings.get("GenerateFinalAnswer", 0.0)
 
 graph = StateGraph(state_schema=QAState)
 
-graph.add_node("ImproveQuestion", RunnableLambda(improve_question_func))
-graph.add_node("RetrieveDualEncoder", RunnableLambda(retrieve_dual_encoder))
-graph.add_node("GenerateFinalAnswer", RunnableLambda(generate_final_answer))
+graph.add_node("ImproveAndRetrieve", RunnableLambda(improve_and_retrieve))
+graph.add_node("LocalAnswer", RunnableLambda(timed("LocalAnswer", generate_local_answer)))
+graph.add_node("GenerateFinalAnswer", RunnableLambda(timed("GenerateFinalAnswer", generate_final_answer)))
 
-graph.set_entry_point("ImproveQuestion")
-graph.add_edge("ImproveQuestion", "RetrieveDualEncoder")
-graph.add_edge("RetrieveDualEncoder", "GenerateFinalAnswer")
+# Fan out: the local T5 answer runs concurrently with the Groq rewrite + retrieval branch,
+# and GenerateFinalAnswer waits for both. LangGraph runs nodes in supersteps, so the
+# rewrite and retrieval share one node; as two nodes, retrieval would wait for LocalAnswer.
+graph.add_edge(START, "ImproveAndRetrieve")
+graph.add_edge(START, "LocalAnswer")
+graph.add_edge(["ImproveAndRetrieve", "LocalAnswer"], "GenerateFinalAnswer")
 graph.add_edge("GenerateFinalAnswer", END)
 
 qa_graph = graph.compile()
 
+# Semantic answer cache in front of qa_graph: near-duplicate questions ("how do I return",
+# "return policy?") are matched on their question_encoder embedding
+from semantic_cache import SemanticCache
+
+answer_cache = SemanticCache(
+    threshold=float(os.getenv("QNA_CACHE_THRESHOLD", "0.92")),
+    max_entries=int(os.getenv("QNA_CACHE_MAX_ENTRIES", "1024")),
+    ttl_seconds=float(os.getenv("QNA_CACHE_TTL_SECONDS", "3600")),
+)
+
 # === FLASK APP ===
 from flask import Flask, request, jsonify, render_template
 from flask_cors import CORS
@@ -224,15 +242,45 @@ def ask():
         if not question:
             return jsonify({"error": "Question is required"}), 400
 
+        start = time.perf_counter()
+        question_embedding = get_embeddings(question_encoder, [question])[0].numpy()
+        cached = answer_cache.get(question_embedding)
+        if cached is not None:
+            answer, similarity = cached
+            return jsonify({
+                "question": question,
+                "answer": answer,
+                "cached": True,
+                "similarity": round(similarity, 4),
+                "timings": {"total": round(time.perf_counter() - start, 4)}
+            })
+
         result = qa_graph.invoke({"question": question})
+        timings = dict(result.get("timings", {}))
+        timings["critical_path"] = round(critical_path_seconds(timings), 4)
+        timings["total"] = round(time.perf_counter() - start, 4)
+        print(f"==[ TIMINGS (s) ]== {timings}")
+        if result.get("final_answer"):
+            answer_cache.put(question_embedding, result["final_answer"])
         return jsonify({
             "question": question,
-            "answer": result.get("final_answer", "No answer generated.")
+            "answer": result.get("final_answer", "No answer generated."),
+            "cached": False,
+            "timings": timings
         })
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify(answer_cache.stats())
+
+@app.route("/cache/clear", methods=["POST"])
+def cache_clear():
+    answer_cache.clear()
+    return jsonify(answer_cache.stats())
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5002)
 
@@ -0,0 +1,110 @@
+"""Latency/quality comparison of flan-t5 answerer configurations.
+
+The reference is the original setup: un-merged PEFT model, fp32, beam-5.
+Every candidate is scored against the reference output (exact match and
+ROUGE-L F1), and timed both one question at a time and as a single batch.
+
+    python compare_generation.py --artifacts artifacts/<key> --n 50
+    python compare_generation.py --questions-file questions.txt --device cpu
+"""
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+import torch
+
+from answer_store import AnswerStore
+from t5_answerer import load_answerer, generate_answers
+
+CANDIDATES = [
+    # label, merge, quantize, preset
+    ("merged fp32 beam5", True, False, "beam5"),
+    ("merged int8 beam5", True, True, "beam5"),
+    ("merged int8 beam2", True, True, "beam2"),
+    ("merged int8 greedy", True, True, "greedy"),
+]
+
+
+def rouge_l_f1(candidate, reference):
+    a, b = candidate.split(), reference.split()
+    if not a or not b:
+        return float(a == b)
+    lcs = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i, x in enumerate(a):
+        for j, y in enumerate(b):
+            lcs[i + 1][j + 1] = lcs[i][j] + 1 if x == y else max(lcs[i][j + 1], lcs[i + 1][j])
+    hit = lcs[-1][-1]
+    if hit == 0:
+        return 0.0
+    precision, recall = hit / len(a), hit / len(b)
+    return 2 * precision * recall / (precision + recall)
+
+
+def load_questions(args):
+    if args.questions_file:
+        with open(args.questions_file, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+        return questions[:args.n], [""] * min(args.n, len(questions))
+
+    store = AnswerStore.open(os.path.join(args.artifacts, "qna_df.parquet"), os.path.join(args.artifacts, "qna_df.arrow"))
+    ids = random.Random(args.seed).sample(range(len(store)), args.n)
+    questions = [store.question(i) for i in ids]
+    # Production calls the answerer with an empty context; --with-context uses the stored answer
+    contexts = [store.answer(i) if args.with_context else "" for i in ids]
+    return questions, contexts
+
+
+def run(model, tokenizer, questions, contexts, preset, batch_size):
+    latencies, outputs = [], []
+    for q, c in zip(questions, contexts):
+        start = time.perf_counter()
+        outputs.extend(generate_answers([q], [c], model, tokenizer, preset))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    for i in range(0, len(questions), batch_size):
+        generate_answers(questions[i:i + batch_size], contexts[i:i + batch_size], model, tokenizer, preset)
+    batched_qps = len(questions) / (time.perf_counter() - start)
+    return outputs, np.array(latencies), batched_qps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--artifacts", help="artifact directory built by qna_artifacts.py")
+    parser.add_argument("--questions-file", help="one question per line (used instead of --artifacts)")
+    parser.add_argument("--with-context", action="store_true")
+    parser.add_argument("--n", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu",
+                        help="device for the reference and fp32 candidates (int8 always runs on CPU)")
+    args = parser.parse_args()
+    if not (args.artifacts or args.questions_file):
+        parser.error("pass --artifacts or --questions-file")
+
+    questions, contexts = load_questions(args)
+
+    model, tokenizer = load_answerer(args.device, merge=False, quantize=False)
+    reference, ref_latencies, ref_qps = run(model, tokenizer, questions, contexts, "beam5", args.batch_size)
+    del model
+
+    print(f"{len(questions)} questions, batch size {args.batch_size}")
+    print(f"{'config':<26} {'p50_ms':>8} {'p95_ms':>8} {'batch_q/s':>10} {'exact':>6} {'rougeL':>7}")
+    p50, p95 = np.percentile(ref_latencies, [50, 95])
+    print(f"{'reference peft beam5':<26} {p50:>8.0f} {p95:>8.0f} {ref_qps:>10.2f} {1.0:>6.2f} {1.0:>7.3f}")
+
+    for label, merge, quantize, preset in CANDIDATES:
+        device = "cpu" if quantize else args.device
+        model, tokenizer = load_answerer(device, merge=merge, quantize=quantize)
+        outputs, latencies, qps = run(model, tokenizer, questions, contexts, preset, args.batch_size)
+        exact = np.mean([o == r for o, r in zip(outputs, reference)])
+        rouge = np.mean([rouge_l_f1(o, r) for o, r in zip(outputs, reference)])
+        p50, p95 = np.percentile(latencies, [50, 95])
+        print(f"{label + ' (' + device + ')':<26} {p50:>8.0f} {p95:>8.0f} {qps:>10.2f} {exact:>6.2f} {rouge:>7.3f}")
+        del model
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import torch
+import torch.nn as nn
+from transformers import AutoModel
+
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+
+
+class DualEncoder(nn.Module):
+    def __init__(self, model_name, output_dim=128):
+        super().__init__()
+        self.base_model = AutoModel.from_pretrained(model_name)
+        self.projection = nn.Linear(self.base_model.config.hidden_size, output_dim)
+
+    def forward(self, input_ids, attention_mask):
+        output = self.base_model(input_ids=input_ids, attention_mask=attention_mask)
+        cls_token = output.last_hidden_state[:, 0]
+        return self.projection(cls_token)
+
+
+def load_encoder(weights_path, device, model_name=MODEL_NAME):
+    encoder = DualEncoder(model_name).to(device)
+    encoder.load_state_dict(torch.load(weights_path, map_location=device))
+    encoder.eval()
+    return encoder
+
+
+def encode_texts(model, tokenizer, texts, device, batch_size=256):
+    all_embeddings = []
+    for i in range(0, len(texts), batch_size):
+        batch_texts = texts[i:i+batch_size]
+        tokens = tokenizer(batch_texts, padding=True, truncation=True, return_tensors='pt', max_length=64)
+        tokens.pop("token_type_ids", None)
+        tokens = {k: v.to(device) for k, v in tokens.items()}
+        with torch.no_grad():
+            emb = model(**tokens)
+        all_embeddings.append(emb.cpu())
+    return torch.cat(all_embeddings, dim=0)
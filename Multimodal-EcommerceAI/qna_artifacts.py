@@ -0,0 +1,119 @@
+"""Content-addressed build step for the chat-qna answer store and embeddings.
+
+Artifacts live in artifacts/<key>/, where <key> hashes the source CSV, the
+sample seed and size, and the answer-encoder weights. The server only loads
+them, and refuses to start on artifacts that do not match its inputs.
+
+    python qna_artifacts.py --csv single_qna.csv --seed 42 --sample-size 100000
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+
+import torch
+
+from answer_store import AnswerStore
+from dual_encoder import MODEL_NAME
+
+# Bump whenever the build recipe changes so old artifacts stop matching
+ARTIFACT_VERSION = 1
+ARTIFACT_ROOT = "artifacts"
+MANIFEST_NAME = "manifest.json"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def artifact_inputs(csv_path, encoder_weights, seed, sample_size, model_name=MODEL_NAME):
+    return {
+        "version": ARTIFACT_VERSION,
+        "csv_sha256": file_sha256(csv_path),
+        "encoder_sha256": file_sha256(encoder_weights),
+        "model_name": model_name,
+        "seed": seed,
+        "sample_size": sample_size,
+    }
+
+
+def artifact_key(inputs):
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def build_artifacts(csv_path, encoder_weights, seed=42, sample_size=100000, root=ARTIFACT_ROOT, device="cpu", batch_size=256):
+    import pandas as pd
+    from transformers import AutoTokenizer
+    from dual_encoder import load_encoder, encode_texts
+
+    inputs = artifact_inputs(csv_path, encoder_weights, seed, sample_size)
+    key = artifact_key(inputs)
+    out_dir = os.path.join(root, key)
+    if os.path.exists(os.path.join(out_dir, MANIFEST_NAME)):
+        print(f"✅ Artifacts {key} are up to date")
+        return out_dir
+
+    tmp_dir = f"{out_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    df = pd.read_csv(csv_path)[['Question', 'Answer']].dropna()
+    df = df.sample(n=min(sample_size, len(df)), random_state=seed).reset_index(drop=True)
+    parquet_path = os.path.join(tmp_dir, "qna_df.parquet")
+    df.to_parquet(parquet_path, index=False)
+    AnswerStore.convert(parquet_path, os.path.join(tmp_dir, "qna_df.arrow"))
+
+    print("➡️ Generating answer embeddings...")
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    answer_encoder = load_encoder(encoder_weights, device)
+    answer_embeddings = encode_texts(answer_encoder, tokenizer, df['Answer'].tolist(), device, batch_size=batch_size)
+    torch.save(answer_embeddings, os.path.join(tmp_dir, "answer_embeddings.pt"))
+
+    manifest = dict(inputs, key=key, rows=len(df), embedding_dim=answer_embeddings.shape[1])
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    os.replace(tmp_dir, out_dir)
+    print(f"✅ Built artifacts {key} ({len(df)} rows)")
+    return out_dir
+
+
+def load_artifacts(csv_path, encoder_weights, seed=42, sample_size=100000, root=ARTIFACT_ROOT, device="cpu"):
+    key = artifact_key(artifact_inputs(csv_path, encoder_weights, seed, sample_size))
+    art_dir = os.path.join(root, key)
+    manifest_path = os.path.join(art_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(
+            f"No artifacts for key {key} in {root}/ (CSV, seed, sample size or encoder weights changed?). "
+            f"Run: python qna_artifacts.py --csv {csv_path} --seed {seed} --sample-size {sample_size}"
+        )
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    answer_store = AnswerStore.open(os.path.join(art_dir, "qna_df.parquet"), os.path.join(art_dir, "qna_df.arrow"))
+    answer_embeddings = torch.load(os.path.join(art_dir, "answer_embeddings.pt"), map_location=device)
+    if answer_embeddings.shape[0] != len(answer_store) or len(answer_store) != manifest["rows"]:
+        raise ValueError(
+            f"Artifacts {key} are inconsistent: {answer_embeddings.shape[0]} embeddings for "
+            f"{len(answer_store)} answers (manifest says {manifest['rows']}). Rebuild them."
+        )
+    return answer_store, answer_embeddings, manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="single_qna.csv")
+    parser.add_argument("--encoder-weights", default="a_encoder_finetuned.pth")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--sample-size", type=int, default=100000)
+    parser.add_argument("--root", default=ARTIFACT_ROOT)
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    build_artifacts(args.csv, args.encoder_weights, args.seed, args.sample_size, args.root, device, args.batch_size)
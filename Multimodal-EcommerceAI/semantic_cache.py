@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticCache:
+    """Answer cache keyed by question embedding instead of exact text.
+
+    A lookup returns the stored value of the most similar cached question if
+    its cosine similarity is at least `threshold`. Entries expire after
+    `ttl_seconds` and the least recently used entry is evicted once
+    `max_entries` is reached. Safe to share between request threads.
+    """
+
+    def __init__(self, threshold=0.92, max_entries=1024, ttl_seconds=3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()  # id -> (unit embedding, value, expires_at)
+        self._next_id = 0
+        self._matrix = None
+        self._ids = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(embedding):
+        v = np.asarray(embedding, dtype="float32").reshape(-1)
+        return v / max(float(np.linalg.norm(v)), 1e-12)
+
+    def _drop(self, entry_id):
+        del self._entries[entry_id]
+        self._matrix = None
+
+    def _purge_expired(self, now):
+        expired = [i for i, (_, _, expires_at) in self._entries.items() if expires_at <= now]
+        for entry_id in expired:
+            self._drop(entry_id)
+        self.expirations += len(expired)
+
+    def get(self, embedding):
+        """Return (value, similarity) for the closest cached question, or None."""
+        query = self._unit(embedding)
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            if not self._entries:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._ids = list(self._entries)
+                self._matrix = np.stack([self._entries[i][0] for i in self._ids])
+
+            similarities = self._matrix @ query
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            entry_id = self._ids[best]
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return self._entries[entry_id][1], similarity
+
+    def put(self, embedding, value):
+        with self._lock:
+            now = time.monotonic()
+            self._purge_expired(now)
+            while len(self._entries) >= self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+            self._entries[self._next_id] = (self._unit(embedding), value, now + self.ttl_seconds)
+            self._next_id += 1
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "threshold": self.threshold,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+            }
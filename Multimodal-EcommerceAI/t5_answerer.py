@@ -0,0 +1,55 @@
+import torch
+import torch.nn as nn
+from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+from peft import PeftModel
+
+BASE_MODEL = "google/flan-t5-base"
+ADAPTER_DIR = "trainer_Generative_qa_model"
+TOKENIZER_DIR = "tokenizer_Generative_qa_model"
+
+# Decoding settings; "beam5" is the original generate_answer configuration
+GENERATION_PRESETS = {
+    "beam5": dict(num_beams=5, early_stopping=True),
+    "beam2": dict(num_beams=2, early_stopping=True),
+    "greedy": dict(num_beams=1),
+}
+COMMON_GENERATION_ARGS = dict(max_length=128, min_length=20, repetition_penalty=1.2, length_penalty=1.0)
+
+
+def load_answerer(device, merge=True, quantize=False):
+    """Load the fine-tuned flan-t5 answerer on any device.
+
+    merge=True folds the LoRA adapter into the base weights, which removes the
+    adapter's extra matmuls per layer. quantize=True applies int8 dynamic
+    quantization to every nn.Linear and only works on CPU.
+    """
+    device = torch.device(device)
+    if quantize and device.type != "cpu":
+        raise ValueError("int8 dynamic quantization is CPU-only; use quantize=False on GPU")
+
+    tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_DIR)
+    base_model = AutoModelForSeq2SeqLM.from_pretrained(BASE_MODEL)
+    base_model.resize_token_embeddings(len(tokenizer))
+    model = PeftModel.from_pretrained(base_model, ADAPTER_DIR)
+    if merge or quantize:
+        model = model.merge_and_unload()
+    model.eval()
+    if quantize:
+        model = torch.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    return model.to(device), tokenizer
+
+
+def generate_answers(questions, contexts, model, tokenizer, preset="beam5"):
+    """Batched generation: one padded encoder pass and one decode loop for all inputs."""
+    device = next(model.parameters()).device
+    input_texts = [f"question: {q} context: {c}" for q, c in zip(questions, contexts)]
+    inputs = tokenizer(input_texts, return_tensors="pt", padding=True, truncation=True).to(device)
+
+    with torch.no_grad():
+        outputs = model.generate(
+            input_ids=inputs["input_ids"],
+            attention_mask=inputs["attention_mask"],
+            **COMMON_GENERATION_ARGS,
+            **GENERATION_PRESETS[preset],
+        )
+    return [answer.strip() for answer in tokenizer.batch_decode(outputs, skip_special_tokens=True)]
@@ -1,12 +1,15 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context
 import torch
 import json
-import numpy as np
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import os
 from transformers import BertTokenizer, BertModel
-from sklearn.metrics.pairwise import cosine_similarity
 from langchain_groq import ChatGroq
 from dotenv import load_dotenv
+from headline_index import load_headline_index, build_headline_index, encode_batch, embed_texts, search_headline_index
+from micro_batcher import MicroBatcher
 
 # ✅ Initialize Flask App
 app = Flask(__name__)
@@ -51,51 +54,105 @@ category_labels = {0: 'U.S. NEWS', 1: 'COMEDY', 2: 'PARENTING', 3: 'WORLD NEWS',
     15: 'BUSINESS', 16: 'STYLE & BEAUTY', 17: 'FOOD & DRINK', 18: 'MEDIA',
     19: 'QUEER VOICES', 20: 'HOME & LIVING', 21: 'WOMEN'}
 
-# ✅ Function to Predict Category
-def predict_category(text):
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-    inputs = {key: value.to(device) for key, value in inputs.items()}
+# ✅ Function to Encode a Query (one BERT pass shared by classification and similarity search)
+def encode_query(text):
+    return encode_batch([text], tokenizer, embedding_model, device)
+
+# ✅ Function to Classify a Batch of Queries (one padded BERT + classifier forward)
+def classify_batch(texts):
+    sentence_embeddings = encode_batch(texts, tokenizer, embedding_model, device)
     with torch.no_grad():
-        embeddings = embedding_model(**inputs).last_hidden_state.mean(dim=1).unsqueeze(0)
-        outputs = model(embeddings)
-        predicted_class = torch.argmax(outputs, dim=1).item()
-    return category_labels[predicted_class]
+        # Each query is a length-1 sequence: (batch, 1, hidden)
+        outputs = model(sentence_embeddings.unsqueeze(1))
+        predicted_classes = torch.argmax(outputs, dim=1).tolist()
+    embeddings = sentence_embeddings.cpu().numpy()
+    return [(category_labels[c], embeddings[i]) for i, c in enumerate(predicted_classes)]
+
+# ✅ Function to Predict Category (goes through the micro-batcher like every other caller)
+def predict_category(text):
+    return category_batcher.submit(text)[0]
 
 # ✅ Load News Data
-with open("filtered_news.json", "r", encoding="utf-8") as f:
+news_path = "filtered_news.json"
+with open(news_path, "r", encoding="utf-8") as f:
     news_data = json.load(f)
 
+# ✅ Load Headline Embedding Index (rebuilt only when filtered_news.json changes)
+index_dir = "headline_index"
+headline_index = load_headline_index(news_path, index_dir)
+if headline_index is None:
+    print("➡️ Building headline embedding index...")
+    build_headline_index(news_path, index_dir, lambda texts: embed_texts(texts, tokenizer, embedding_model, device))
+    headline_index = load_headline_index(news_path, index_dir)
+
 # ✅ Function to Compute Sentence Embeddings
 def get_embedding(text):
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding="max_length", max_length=128)
-    inputs = {key: value.to(device) for key, value in inputs.items()}
-    with torch.no_grad():
-        embedding = embedding_model(**inputs).last_hidden_state.mean(dim=1).cpu().numpy()
-    return embedding
+    return encode_query(text).cpu().numpy()
 
 # ✅ Function to Find Similar Articles
-def get_similar_articles(text, predicted_category, top_n=10):
-    category_articles = [article for article in news_data if article["category"] == predicted_category]
-    if not category_articles:
+def get_similar_articles(text, predicted_category, top_n=10, input_embedding=None):
+    if predicted_category not in headline_index:
         return []
-    input_embedding = get_embedding(text)
-    article_embeddings = np.vstack([get_embedding(article["headline"]) for article in category_articles])
-    similarities = cosine_similarity(input_embedding, article_embeddings).flatten()
-    top_indices = similarities.argsort()[-top_n:][::-1]
-    return [category_articles[i] for i in top_indices]
+    if input_embedding is None:
+        input_embedding = get_embedding(text)
+    article_ids = search_headline_index(headline_index, predicted_category, input_embedding, top_n)
+    return [news_data[i] for i in article_ids]
 
 # ✅ Load API Key & Initialize LLM
 load_dotenv()
 groq_api_key = os.getenv("GROQ_API_KEY")
 llm = ChatGroq(groq_api_key=groq_api_key, model_name="Llama3-8b-8192")
 
-# ✅ Function to Get Response
+# ✅ Micro-batching Queue: concurrent requests share one classification forward
+category_batcher = MicroBatcher(
+    classify_batch,
+    max_batch_size=int(os.getenv("PREDICT_MAX_BATCH_SIZE", "16")),
+    max_wait_ms=float(os.getenv("PREDICT_MAX_WAIT_MS", "5")),
+)
+
+# ✅ Thread Pool for Overlapping Retrieval with the LLM Call
+# RESPONSE_WORKERS (default 32) caps how many non-streaming LLM calls from "/" run at
+# once; further requests wait for a free worker. Streams use their own threads.
+executor = ThreadPoolExecutor(max_workers=int(os.getenv("RESPONSE_WORKERS", "32")))
+
+def build_prompt(user_query, predicted_category):
+    return f"User Query: {user_query}\nPredicted Category: {predicted_category}\n\nGenerate a helpful response based on the category."
+
+# ✅ Function to Get Response (LLM call and article retrieval run concurrently)
 def get_response(user_query):
-    predicted_category = predict_category(user_query)
-    similar_articles = get_similar_articles(user_query, predicted_category, top_n=10)
-    response = llm.invoke(f"User Query: {user_query}\nPredicted Category: {predicted_category}\n\nGenerate a helpful response based on the category.")
+    predicted_category, sentence_embedding = category_batcher.submit(user_query)
+    llm_future = executor.submit(llm.invoke, build_prompt(user_query, predicted_category))
+    similar_articles = get_similar_articles(user_query, predicted_category, top_n=10, input_embedding=sentence_embedding)
+    response = llm_future.result()
     return response, predicted_category, similar_articles
 
+# ✅ Function to Stream LLM Tokens from a Background Thread
+def stream_llm(prompt):
+    tokens = queue.Queue()
+
+    def produce():
+        try:
+            for chunk in llm.stream(prompt):
+                tokens.put(("token", chunk.content))
+        except Exception as e:
+            tokens.put(("error", str(e)))
+        tokens.put(("done", None))
+
+    def consume():
+        while True:
+            kind, value = tokens.get()
+            if kind == "done":
+                return
+            yield kind, value
+
+    # Started eagerly so generation begins before the caller iterates. A dedicated
+    # thread, so long streams never hold workers the "/" route's LLM calls need.
+    threading.Thread(target=produce, daemon=True).start()
+    return consume()
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 # ✅ Flask Routes
 @app.route("/", methods=["GET", "POST"])
 def home():
@@ -106,6 +163,26 @@ def home():
             return render_template("index.html", text=text, category=category, response=response, articles=articles)
     return render_template("index.html", text=None, category=None, response=None, articles=None)
 
+# ✅ Streaming Variant: category and articles first, then LLM tokens (Server-Sent Events)
+@app.route("/stream", methods=["POST"])
+def stream():
+    text = request.form.get("text_input") or (request.get_json(silent=True) or {}).get("text_input")
+    if not text:
+        return jsonify({"error": "text_input is required"}), 400
+
+    def generate():
+        predicted_category, sentence_embedding = category_batcher.submit(text)
+        yield sse("category", predicted_category)
+        # Start generation before retrieval so the two overlap
+        tokens = stream_llm(build_prompt(text, predicted_category))
+        yield sse("articles", get_similar_articles(text, predicted_category, top_n=10, input_embedding=sentence_embedding))
+        for kind, value in tokens:
+            yield sse(kind, value)
+        yield sse("done", None)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # ✅ Run Flask App
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,66 @@
+"""Load test for the category-prediction micro-batcher.
+
+Runs a fixed number of concurrent clients against MicroBatcher(classify_batch)
+for several (max batch size, max wait) settings and prints throughput against
+latency. max_batch_size=1 is the old one-forward-per-request behaviour.
+
+    python benchmark_batching.py --clients 32 --requests 20
+"""
+import argparse
+import random
+import threading
+import time
+
+import numpy as np
+
+from app import classify_batch, news_data
+from micro_batcher import MicroBatcher
+
+
+def run_load(batcher, queries, clients, requests_per_client):
+    latencies = []
+    lock = threading.Lock()
+
+    def client(seed):
+        rng = random.Random(seed)
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            batcher.submit(rng.choice(queries))
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    return wall, np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--waits-ms", type=float, nargs="+", default=[2, 5, 10])
+    args = parser.parse_args()
+
+    queries = [article["headline"] for article in news_data[:1000]]
+    classify_batch(queries[:8])  # warm-up
+
+    print(f"{'batch':>5} {'wait_ms':>7} {'req/s':>8} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'mean_batch':>10}")
+    for max_batch_size in args.batch_sizes:
+        waits = [0.0] if max_batch_size == 1 else args.waits_ms
+        for max_wait_ms in waits:
+            batcher = MicroBatcher(classify_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+            wall, latencies = run_load(batcher, queries, args.clients, args.requests)
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            print(f"{max_batch_size:>5} {max_wait_ms:>7.1f} {len(latencies) / wall:>8.1f} "
+                  f"{p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {batcher.stats()['mean_batch_size']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
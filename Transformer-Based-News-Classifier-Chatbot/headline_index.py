@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import torch
+
+# Bump whenever the way headlines are embedded changes, so stale indexes get rebuilt
+INDEX_VERSION = "bert-base-uncased/masked-mean-pool/dynamic-padding"
+MANIFEST_NAME = "manifest.json"
+
+
+# ✅ Hash the news file so the index is only rebuilt when it changes
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype("float32")
+
+
+# ✅ One encoder pass over a dynamically padded batch, mean-pooled over real tokens only
+def encode_batch(texts, tokenizer, model, device):
+    inputs = tokenizer(texts, return_tensors="pt", truncation=True, padding=True)
+    inputs = {key: value.to(device) for key, value in inputs.items()}
+    with torch.no_grad():
+        hidden = model(**inputs).last_hidden_state
+    mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+    return (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+
+
+# ✅ Batched headline embeddings; sorting by length keeps padding per batch small
+def embed_texts(texts, tokenizer, model, device, batch_size=64):
+    if not texts:
+        return np.zeros((0, model.config.hidden_size), dtype="float32")
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    embeddings = np.empty((len(texts), model.config.hidden_size), dtype="float32")
+    for i in range(0, len(order), batch_size):
+        batch = order[i:i + batch_size]
+        embeddings[batch] = encode_batch([texts[j] for j in batch], tokenizer, model, device).cpu().numpy()
+    return embeddings
+
+
+# ✅ Embed every headline once into one normalized matrix per category
+def build_headline_index(news_path, index_dir, embed_fn):
+    with open(news_path, "r", encoding="utf-8") as f:
+        news_data = json.load(f)
+
+    by_category = {}
+    for i, article in enumerate(news_data):
+        by_category.setdefault(article["category"], []).append(i)
+
+    os.makedirs(index_dir, exist_ok=True)
+    categories = {}
+    for n, (category, article_ids) in enumerate(sorted(by_category.items())):
+        # Category names contain spaces and "&", so files are numbered instead
+        filename = f"category_{n}.npy"
+        matrix = normalize(embed_fn([news_data[i]["headline"] for i in article_ids]))
+        np.save(os.path.join(index_dir, filename), matrix)
+        categories[category] = {"file": filename, "articles": article_ids}
+
+    manifest = {
+        "source_sha256": file_sha256(news_path),
+        "version": INDEX_VERSION,
+        "categories": categories,
+    }
+    # Write the manifest last so a half-built index is never picked up
+    manifest_path = os.path.join(index_dir, MANIFEST_NAME)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return manifest
+
+
+# ✅ Memory-map the per-category matrices; returns None if missing or stale
+def load_headline_index(news_path, index_dir):
+    manifest_path = os.path.join(index_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != INDEX_VERSION or manifest.get("source_sha256") != file_sha256(news_path):
+        return None
+
+    index = {}
+    for category, entry in manifest["categories"].items():
+        matrix = np.load(os.path.join(index_dir, entry["file"]), mmap_mode="r")
+        index[category] = (matrix, entry["articles"])
+    return index
+
+
+# ✅ One matrix-vector product + top-k instead of re-embedding every headline
+def search_headline_index(index, category, query_embedding, top_n=10):
+    if category not in index:
+        return []
+    matrix, article_ids = index[category]
+    if not article_ids:
+        return []
+
+    query = normalize(np.asarray(query_embedding, dtype="float32").reshape(1, -1))[0]
+    similarities = matrix @ query
+    k = min(top_n, len(article_ids))
+    top = np.argpartition(-similarities, k - 1)[:k]
+    top = top[np.argsort(-similarities[top])]
+    return [article_ids[i] for i in top]
+
+
+# ✅ Standalone build step: python headline_index.py
+if __name__ == "__main__":
+    from transformers import BertTokenizer, BertModel
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    tokenizer = BertTokenizer.from_pretrained("model")
+    embedding_model = BertModel.from_pretrained("bert-base-uncased").to(device)
+    embedding_model.eval()
+
+    manifest = build_headline_index(
+        "filtered_news.json",
+        "headline_index",
+        lambda texts: embed_texts(texts, tokenizer, embedding_model, device),
+    )
+    total = sum(len(entry["articles"]) for entry in manifest["categories"].values())
+    print(f"✅ Indexed {total} headlines across {len(manifest['categories'])} categories")